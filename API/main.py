@@ -1,13 +1,28 @@
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Query, HTTPException, Request
+from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from contextlib import asynccontextmanager
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import numpy as np
-import random
-from typing import List, Dict, Any
-from scanner import data_loader, technicals, backtester
+from typing import List, Dict, Any, Optional
+from scanner import data_loader, technicals, backtester, charting, executor, http_cache, portfolio, providers, result_cache, rules, scan_index, scoring, single_flight, sweep, walk_forward
 from llm.summaries import summarize_stock
 
-app = FastAPI(title="Stock Scanner API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app):
+    # The background /scan snapshot is opt-in: every API process builds its
+    # own, and each build scans the whole universe
+    if scan_index.snapshot_enabled():
+        scan_index.start_scheduler(build_scan_snapshot)
+    yield
+
+app = FastAPI(title="Stock Scanner API", version="1.0.0", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -17,87 +32,141 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def run_scanner_api(price_filter: str = "All", max_results: int = 10):
-    """Core scanner logic extracted from Streamlit app"""
+@app.exception_handler(executor.Overloaded)
+async def overloaded_handler(request, exc):
+    # Shed load quickly and tell the client when to come back
+    return JSONResponse(
+        status_code=exc.status,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+# Chunks of the universe evaluated at once by /scan
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", str(data_loader.BULK_MAX_WORKERS)))
+# Tickers covered by the background scan snapshot (0 = whole screener universe)
+SCAN_SNAPSHOT_UNIVERSE = int(os.getenv("SCAN_SNAPSHOT_UNIVERSE", "0"))
+# Most tickers one /charts or /summaries request may ask for
+MAX_BATCH_TICKERS = int(os.getenv("MAX_BATCH_TICKERS", "50"))
+# LLM calls a /summaries request makes at once
+SUMMARY_BATCH_CONCURRENCY = int(os.getenv("SUMMARY_BATCH_CONCURRENCY", "4"))
+# Whether POST/DELETE /setups may change the active rules (off by default:
+# rules are evaluated for every caller, so editing them is an admin action)
+ALLOW_SETUP_EDITS = os.getenv("ALLOW_SETUP_EDITS", "0") == "1"
+
+# Identical concurrent live scans and summaries run once and share the result
+_scan_flight = single_flight.SingleFlight("scan")
+_summary_flight = single_flight.SingleFlight("summary")
+
+# Scan tables per chunk of the universe, keyed by the chunk's tickers and
+# their data versions: a live scan re-evaluates only chunks whose bars may
+# have changed, and while every ticker is fresh it never touches the bars
+_chunk_tables = result_cache.ResultCache("scan_chunks", max_bytes=32 * 1024 * 1024, directory="")
+
+def _chunk_key(chunk, context):
+    """Cache key of a chunk's scan table, or None while any ticker may be stale"""
+    versions = []
+    for ticker in chunk:
+        version = data_loader.get_fresh_data_version(ticker)
+        if version is None:
+            return None
+        versions.append(version)
+    return result_cache.make_key("scan", chunk, versions, context)
+
+def _scan_chunk(frames):
+    """
+    Evaluate one chunk of loaded frames; returns a scan_panel_table or None.
+    Each calendar gets its own panel, so tickers with other trading days
+    don't put gaps in each other's rolling windows
+    """
+    return scoring.concat_tables(
+        technicals.scan_panel_table(technicals.build_panel(group))
+        for group in technicals.group_frames(frames)
+    )
+
+def _scan_universe(tickers):
+    """
+    Candidate table and scores for every setup among `tickers`, in chunks of
+    BULK_CHUNK_SIZE. Chunks with a cached table for their current data are
+    reused; the rest are fetched in one get_data_many call, which does its
+    own chunking and parallelism, and evaluated SCAN_CONCURRENCY at a time
+    """
+    tickers = list(dict.fromkeys(tickers))
+    chunk_size = data_loader.BULK_CHUNK_SIZE
+    chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+    # Tables also depend on the period slice (moves with the date) and on
+    # the rules and labels
+    context = (_market_date(), [(r.name, r.label, r.expression) for r in rules.get_rules().rules])
+
+    tables, stale = [], []
+    for chunk in chunks:
+        key = _chunk_key(chunk, context)
+        cached = _chunk_tables.get(key) if key else None
+        if cached is not None:
+            tables.append(cached[0])
+        else:
+            stale.append(chunk)
+
+    if stale:
+        frames, failed = data_loader.get_data_many([ticker for chunk in stale for ticker in chunk])
+        for ticker, reason in failed.items():
+            print(f"⚠️ Error with {ticker}: {reason}")
+        keys = [_chunk_key(chunk, context) for chunk in stale]
+
+        def scan(chunk, key):
+            try:
+                table = _scan_chunk({ticker: frames[ticker] for ticker in chunk if ticker in frames})
+            except Exception as e:
+                print(f"⚠️ Error scanning chunk: {e}")
+                return None
+            if key:
+                _chunk_tables.put(key, (table,))
+            return table
+
+        with ThreadPoolExecutor(max_workers=SCAN_CONCURRENCY) as pool:
+            tables.extend(pool.map(scan, stale, keys))
+
+    table = scoring.concat_tables(tables)
+    if table is None:
+        return None, None
+    return table, scoring.score_setups(table)
+
+def run_scanner_api(price_filter: str = "All", max_results: int = 10,
+                    tie_break: Optional[str] = None, setup_type: Optional[str] = None):
+    """Core scanner logic extracted from Streamlit app: the top setups across the whole filtered universe"""
     tickers = data_loader.get_tickers(price_filter)
-    random.shuffle(tickers)
-    
-    results = []
-    for ticker in tickers:
-        try:
-            df = data_loader.get_data(ticker)
-            if df.empty:
-                continue
+    table, scores = _scan_universe(tickers)
+    if table is None:
+        return []
 
-            latest_price = df["Close"].iloc[-1]
-            
-            if price_filter == "Under $50" and latest_price > 50:
-                continue
-            elif price_filter == "Over $50" and latest_price <= 50:
-                continue
+    # The universe is picked by screener price; re-check against the latest close
+    bucket = scan_index.price_bucket(price_filter)
+    keep = np.ones(len(scores), dtype=bool)
+    if bucket == "under_50":
+        keep = table['price'] <= 50
+    elif bucket == "over_50":
+        keep = table['price'] > 50
+    if setup_type:
+        types = np.array([label.replace(" setup", "").lower() for label in table['setup']])
+        keep = keep & (types == setup_type.lower())
+    table = {key: values[keep] for key, values in table.items()}
+    scores = scores[keep]
 
-            df = technicals.calculate_technicals(df)
-            if not technicals.is_valid_setup(df):
-                continue
-                
-            setup = technicals.describe_setup(df)
-            latest = df.iloc[-1]
-            score = calculate_setup_score(latest, setup)
-            
-            results.append({
-                "ticker": ticker,
-                "score": score,
-                "type": setup.replace(" setup", "").title(),
-                "price": round(latest_price, 2),
-                "rsi": round(latest.get('RSI', 0), 1) if not pd.isna(latest.get('RSI', 0)) else None
-            })
-            
-        except Exception as e:
-            print(f"⚠️ Error with {ticker}: {e}")
-            continue
-            
-        if len(results) >= max_results:
-            break
-    
-    results.sort(key=lambda x: x['score'], reverse=True)
-    return results
-
-def calculate_setup_score(latest_row, setup_type):
-    """Calculate score based on technical indicators (0-100 scale)"""
-    score = 50  # Base score
-    
-    if "Breakout" in setup_type:
-        score += 25
-    elif "Bullish momentum" in setup_type:
-        score += 20
-    elif "Pullback" in setup_type:
-        score += 15
-    
-    rsi = latest_row.get('RSI', 50)
-    if not pd.isna(rsi):
-        if 50 <= rsi <= 70:
-            score += 15
-        elif rsi > 70:
-            score -= 5
-        elif rsi < 30:
-            score -= 10
-    
-    if latest_row.get('Volume_Spike', False):
-        score += 10
-    
-    if latest_row.get('Above_SMA20', False):
-        score += 5
-    
-    return min(100, max(0, int(score)))
+    best = scoring.top_k(table, scores, max_results, tie_break)
+    return [scoring.scan_record(table, scores, i) for i in best]
+
+def build_scan_snapshot():
+    """Scan the whole universe and index every setup by score for /scan"""
+    tickers = data_loader.get_tickers("All", limit=SCAN_SNAPSHOT_UNIVERSE or None)
+    table, scores = _scan_universe(tickers)
+    return scan_index.ScanIndex(table, scores, universe_size=len(tickers))
 
 def get_summary_api(ticker: str):
     """Core summary logic extracted from Streamlit app"""
     try:
-        df = data_loader.get_data(ticker)
+        df = technicals.get_technicals(ticker)
         if df.empty:
             raise HTTPException(status_code=404, detail=f"No data found for {ticker}")
         
-        df = technicals.calculate_technicals(df)
         summary, score = summarize_stock(ticker, df)
         
         return {
@@ -108,65 +177,268 @@ def get_summary_api(ticker: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating summary: {str(e)}")
 
-def get_chart_data_api(ticker: str, period: str = "6mo"):
-    """Extract chart data for candlestick plotting"""
+def get_chart_data_api(ticker: str, period: str = "6mo", max_points: Optional[int] = None, fmt: str = "json"):
+    """Chart data for candlestick plotting, as (body, media type, headers)"""
     try:
-        df = data_loader.get_data(ticker, period=period)
+        df = technicals.get_technicals(ticker, period=period)
         if df.empty:
             raise HTTPException(status_code=404, detail=f"No data found for {ticker}")
-        
-        df = technicals.calculate_technicals(df)
-        
-        chart_data = {
-            "ticker": ticker,
-            "dates": [date.strftime("%Y-%m-%d") for date in df.index],
-            "candles": [
-                {
-                    "open": round(row['Open'], 2),
-                    "high": round(row['High'], 2),
-                    "low": round(row['Low'], 2),
-                    "close": round(row['Close'], 2),
-                    "volume": int(row['Volume'])
-                }
-                for _, row in df.iterrows()
-            ],
-            "sma_20": [round(val, 2) if not pd.isna(val) else None for val in df['SMA_20']],
-            "sma_50": [round(val, 2) if not pd.isna(val) else None for val in df['SMA_50']],
-            "rsi": [round(val, 1) if not pd.isna(val) else None for val in df.get('RSI', [])]
-        }
-        
-        return chart_data
+
+        return charting.render(ticker, charting.chart_arrays(df, max_points), fmt)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting chart data: {str(e)}")
 
+def _market_date():
+    return str(providers.get_provider().now().date())
+
+async def _conditional(request: Request, endpoint, etag_for, render, *args):
+    """
+    Respond with render(*args) -> (body, media type, headers), tagged with the
+    ETag from etag_for() (None when it cannot be known without rendering;
+    etag_for(fresh=False) tags the data as stored, even if due a refresh).
+    A client that already holds the current ETag gets 304 and nothing is
+    rendered; rendered and compressed bodies are reused per ETag.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    accept_encoding = request.headers.get("accept-encoding")
+    etag = etag_for()
+    matched = http_cache.not_modified(if_none_match, etag, accept_encoding)
+    if matched:
+        return Response(status_code=304, headers={"ETag": matched, "Vary": "Accept-Encoding"})
+
+    rendered = http_cache.get(etag) if etag else None
+    if rendered is None:
+        before = etag or etag_for(fresh=False)
+        if endpoint is None:
+            rendered = render(*args)
+        else:
+            rendered = await executor.run(endpoint, render, *args)
+        # Rendering may refresh the data, and other requests may too. Keep the
+        # data ETag only if the version it was rendered from is still current,
+        # so a newer version's ETag never labels this body; else tag the content
+        after = etag_for()
+        etag = after if after is not None and after == before else http_cache.make_etag(rendered[0])
+        http_cache.put(etag, rendered)
+        matched = http_cache.not_modified(if_none_match, etag, accept_encoding, rendered[0])
+        if matched:
+            return Response(status_code=304, headers={"ETag": matched, "Vary": "Accept-Encoding"})
+
+    body, media_type, headers = rendered
+    body, cache_headers = http_cache.encode(etag, body, accept_encoding)
+    return Response(content=body, media_type=media_type, headers={**headers, **cache_headers})
+
+def _scan_response(results, source, snapshot_at):
+    body = JSONResponse({
+        "status": "success",
+        "count": len(results),
+        "results": results,
+        "source": source,
+        "snapshot_at": snapshot_at
+    }).body
+    return body, "application/json", {}
+
+def _render_live_scan(price_filter, limit, tie_break, setup_type):
+    try:
+        results = _scan_flight.do(
+            (price_filter, limit, tie_break, setup_type),
+            run_scanner_api, price_filter, limit, tie_break, setup_type
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Scanner error: {str(e)}")
+    return _scan_response(results, "live", None)
+
 @app.get("/scan")
 async def scan_stocks(
+    request: Request,
     price_filter: str = Query("All", description="Stock price filter: All, Under $50, Over $50"),
-    limit: int = Query(10, description="Maximum number of results")
+    limit: int = Query(10, description="Maximum number of results"),
+    setup_type: str = Query(None, description="Only this setup type, e.g. Breakout"),
+    tie_break: str = Query(None, description="Order equal scores by: rsi, volume_spike"),
+    live: bool = Query(False, description="Scan now instead of answering from the latest snapshot")
 ):
-    """Scan for high-potential stocks using the same logic as the Streamlit app"""
-    try:
-        results = run_scanner_api(price_filter, limit)
-        return {
-            "status": "success",
-            "count": len(results),
-            "results": results
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Scanner error: {str(e)}")
+    """Best-scoring setups, served from the background scan snapshot when one is available"""
+    if tie_break is not None and tie_break not in scoring.TIE_BREAKS:
+        raise HTTPException(status_code=400, detail=f"tie_break must be one of {', '.join(scoring.TIE_BREAKS)}")
+
+    index = scan_index.get_index()
+    if index is not None and not live:
+        snapshot_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(index.built_at))
+        return await _conditional(
+            request, None,
+            lambda fresh=True: http_cache.make_etag("scan", index.built_at, scan_index.price_bucket(price_filter), limit, (setup_type or "").lower(), tie_break),
+            lambda: _scan_response(index.query(price_filter, limit, setup_type, tie_break), "snapshot", snapshot_at)
+        )
+
+    # Off the event loop, so other requests keep being served meanwhile.
+    # A live scan has to run to know its result; unchanged results still get 304
+    return await _conditional(
+        request, "scan", lambda fresh=True: None,
+        _render_live_scan, price_filter, limit, tie_break, setup_type
+    )
+
+def _data_etag(kind, ticker, *params, fresh=True):
+    """
+    ETag from the ticker's current data version, or None if it may be stale
+    (with fresh=False, from the stored version even if it is due a refresh).
+    """
+    version = data_loader.get_fresh_data_version(ticker) if fresh else data_loader.get_data_version(ticker) or None
+    if version is None:
+        return None
+    return http_cache.make_etag(kind, ticker, version, _market_date(), technicals.TECHNICALS_ENGINE, *params)
+
+def _render_summary(ticker):
+    return JSONResponse(_summary_flight.do(ticker, get_summary_api, ticker)).body, "application/json", {}
 
 @app.get("/summary")
-async def get_summary(ticker: str = Query(..., description="Stock ticker symbol")):
+async def get_summary(request: Request, ticker: str = Query(..., description="Stock ticker symbol")):
     """Get AI-generated summary for a specific ticker"""
-    return get_summary_api(ticker.upper())
+    ticker = ticker.upper()
+    return await _conditional(request, "summary", lambda fresh=True: _data_etag("summary", ticker, fresh=fresh), _render_summary, ticker)
 
 @app.get("/chart")
 async def get_chart(
+    request: Request,
     ticker: str = Query(..., description="Stock ticker symbol"),
-    period: str = Query("6mo", description="Time period: 1mo, 3mo, 6mo, 1y, 2y")
+    period: str = Query("6mo", description="Time period: 1mo, 3mo, 6mo, 1y, 2y"),
+    max_points: int = Query(None, description="Downsample to at most this many bars (LTTB on the close)"),
+    format: str = Query("json", description="json (a dict per candle), columns, arrow or float32")
 ):
     """Get candlestick chart data with technical indicators"""
-    return get_chart_data_api(ticker.upper(), period)
+    if format not in charting.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(charting.FORMATS)}")
+    if max_points is not None and max_points < 3:
+        raise HTTPException(status_code=400, detail="max_points must be at least 3")
+
+    ticker = ticker.upper()
+    return await _conditional(
+        request, "chart", lambda fresh=True: _data_etag("chart", ticker, period, max_points, format, fresh=fresh),
+        get_chart_data_api, ticker, period, max_points, format
+    )
+
+def _parse_batch_tickers(tickers):
+    ticker_list = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers.split(",") if ticker.strip()))
+    if not ticker_list:
+        raise HTTPException(status_code=400, detail="No tickers given")
+    if len(ticker_list) > MAX_BATCH_TICKERS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_TICKERS} tickers per request")
+    return ticker_list
+
+def _batch_etag(kind, ticker_list, *params, fresh=True):
+    """ETag from every ticker's current data version, or None if any may be stale (see _data_etag)."""
+    version_of = data_loader.get_fresh_data_version if fresh else lambda t: data_loader.get_data_version(t) or None
+    versions = [version_of(ticker) for ticker in ticker_list]
+    if None in versions:
+        return None
+    return http_cache.make_etag(kind, tuple(ticker_list), tuple(versions), _market_date(), technicals.TECHNICALS_ENGINE, *params)
+
+def _batch_technicals(ticker_list, period):
+    """One bulk load and one batched indicator pass; returns (frames, failed)"""
+    frames, failed = data_loader.get_data_many(ticker_list, period=period)
+    results, rejected = technicals.calculate_technicals_many(frames)
+    failed.update(rejected)
+    for ticker in ticker_list:
+        if ticker not in failed and results.get(ticker, pd.DataFrame()).empty:
+            failed[ticker] = f"No data found for {ticker}"
+    return {ticker: df for ticker, df in results.items() if not df.empty}, failed
+
+def get_charts_api(ticker_list, period="6mo", max_points=None, fmt="json"):
+    """Chart payloads for several tickers keyed by ticker, as (body, media type, headers)"""
+    results, failed = _batch_technicals(ticker_list, period)
+    build = charting.rows_payload if fmt == "json" else charting.columns_payload
+
+    charts = {}
+    for ticker in ticker_list:
+        if ticker in results:
+            try:
+                charts[ticker] = build(ticker, charting.chart_arrays(results[ticker], max_points))
+            except Exception as e:
+                failed[ticker] = f"Error getting chart data: {str(e)}"
+
+    body = charting.encode_json({
+        "status": "success",
+        "period": period,
+        "charts": charts,
+        "failed": {ticker: str(failed[ticker]) for ticker in ticker_list if ticker in failed}
+    })
+    return body, "application/json", {}
+
+def _summarize(ticker, df):
+    summary, score = summarize_stock(ticker, df)
+    return {
+        "ticker": ticker,
+        "summary": summary,
+        "score": score
+    }
+
+def get_summaries_api(ticker_list):
+    """AI summaries for several tickers keyed by ticker, as (body, media type, headers)"""
+    results, failed = _batch_technicals(ticker_list, "6mo")
+
+    def summarize(ticker):
+        # Shares in-flight and recent results with /summary
+        try:
+            return ticker, _summary_flight.do(ticker, _summarize, ticker, results[ticker]), None
+        except Exception as e:
+            return ticker, None, f"Error generating summary: {str(e)}"
+
+    summaries = {}
+    with ThreadPoolExecutor(max_workers=SUMMARY_BATCH_CONCURRENCY) as pool:
+        for ticker, summary, error in pool.map(summarize, [t for t in ticker_list if t in results]):
+            if error:
+                failed[ticker] = error
+            else:
+                summaries[ticker] = summary
+
+    body = JSONResponse({
+        "status": "success",
+        "summaries": {ticker: summaries[ticker] for ticker in ticker_list if ticker in summaries},
+        "failed": {ticker: str(failed[ticker]) for ticker in ticker_list if ticker in failed}
+    }).body
+    return body, "application/json", {}
+
+@app.get("/charts")
+async def get_charts(
+    request: Request,
+    tickers: str = Query(..., description="Comma-separated list of tickers (e.g., 'AAPL,MSFT,TSLA')"),
+    period: str = Query("6mo", description="Time period: 1mo, 3mo, 6mo, 1y, 2y"),
+    max_points: int = Query(None, description="Downsample each chart to at most this many bars (LTTB on the close)"),
+    format: str = Query("json", description="json (a dict per candle) or columns")
+):
+    """Chart data for several tickers in one request, with per-ticker failures"""
+    if format not in ("json", "columns"):
+        raise HTTPException(status_code=400, detail="format must be one of json, columns")
+    if max_points is not None and max_points < 3:
+        raise HTTPException(status_code=400, detail="max_points must be at least 3")
+
+    ticker_list = _parse_batch_tickers(tickers)
+    return await _conditional(
+        request, "charts", lambda fresh=True: _batch_etag("charts", ticker_list, period, max_points, format, fresh=fresh),
+        get_charts_api, ticker_list, period, max_points, format
+    )
+
+@app.get("/summaries")
+async def get_summaries(
+    request: Request,
+    tickers: str = Query(..., description="Comma-separated list of tickers (e.g., 'AAPL,MSFT,TSLA')")
+):
+    """AI-generated summaries for several tickers in one request, with per-ticker failures"""
+    ticker_list = _parse_batch_tickers(tickers)
+    return await _conditional(
+        request, "summaries", lambda fresh=True: _batch_etag("summaries", ticker_list, fresh=fresh),
+        get_summaries_api, ticker_list
+    )
+
+def get_sp500_return(period):
+    """S&P 500 (SPY) percentage return over the period, 0 if unavailable"""
+    try:
+        spy_df = data_loader.get_data("SPY", period=period)
+        if not spy_df.empty:
+            sp500_start = spy_df['Close'].iloc[0]
+            sp500_end = spy_df['Close'].iloc[-1]
+            return round(((sp500_end - sp500_start) / sp500_start) * 100, 2)
+    except Exception as e:
+        print(f"Error getting SPY data: {e}")
+    return 0
 
 @app.get("/backtest")
 async def get_backtest(
@@ -181,13 +453,15 @@ async def get_backtest(
             ticker_list = [ticker.strip().upper() for ticker in tickers.split(",") if ticker.strip()]
         else:
             # If no tickers provided, use default universe from data_loader
-            ticker_list = data_loader.get_tickers(price_filter="All")
+            ticker_list = await executor.run("data", data_loader.get_tickers, price_filter="All")
 
         # Convert min_gain from percentage to decimal (5% -> 0.05)
         min_gain_decimal = min_gain / 100
 
         # Run the backtest using backtester.py logic
-        results = backtester.run_backtest(
+        # Off the event loop, so other requests keep being served meanwhile
+        results = await executor.run(
+            "backtest", backtester.run_backtest,
             tickers=ticker_list,
             period=period,
             min_gain=min_gain_decimal
@@ -201,16 +475,8 @@ async def get_backtest(
         )
 
         # Get S&P 500 return for comparison
-        sp500_return = 0
-        try:
-            spy_df = data_loader.get_data("SPY", period=period)
-            if not spy_df.empty:
-                sp500_start = spy_df['Close'].iloc[0]
-                sp500_end = spy_df['Close'].iloc[-1]
-                sp500_return = round(((sp500_end - sp500_start) / sp500_start) * 100, 2)
-        except Exception as e:
-            print(f"Error getting SPY data: {e}")
-            
+        sp500_return = await executor.run("data", get_sp500_return, period)
+
         return {
             "status": "success",
             "input_params": {
@@ -223,6 +489,7 @@ async def get_backtest(
                 "valid_setups_found": results['setups_found'],
                 "successful_trades": results['successful'],
                 "win_rate_percent": win_rate,
+                "failed_tickers": results.get('failed', []),
                 "scanner_return": results.get('stats', {}).get('total_return', 0),
                 "sp500_return": sp500_return
             },
@@ -233,16 +500,300 @@ async def get_backtest(
             }
         }
         
+    except executor.Overloaded:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Backtest error: {str(e)}")
 
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def _ndjson(record):
+    return json.dumps(record, default=_json_default) + "\n"
+
+def _stream_backtest(ticker_list, period, min_gain):
+    # One JSON object per line: ticker results as they finish, progress
+    # after every batch, then the same summary /backtest returns
+    try:
+        for event in backtester.iter_backtest(ticker_list, period=period, min_gain=min_gain / 100):
+            if event[0] == "ticker":
+                _, ticker, trades, successful = event
+                yield _ndjson({
+                    "type": "ticker",
+                    "ticker": ticker,
+                    "successful": successful,
+                    "trades": trades.to_dict('records') if trades is not None else []
+                })
+                continue
+
+            totals = event[1]
+            win_rate = (
+                round((totals['successful'] / totals['setups_found']) * 100, 2)
+                if totals['setups_found'] > 0
+                else 0
+            )
+            results = {
+                "total_stocks_checked": totals['total'],
+                "processed": totals['processed'],
+                "valid_setups_found": totals['setups_found'],
+                "successful_trades": totals['successful'],
+                "win_rate_percent": win_rate,
+                "failed_tickers": totals['failed'],
+                "scanner_return": totals['stats']['total_return'],
+            }
+            if event[0] == "progress":
+                yield _ndjson({"type": "progress", "results": results})
+                continue
+
+            results["sp500_return"] = get_sp500_return(period)
+            yield _ndjson({
+                "type": "summary",
+                "input_params": {
+                    "tickers_count": len(ticker_list),
+                    "period": period,
+                    "min_gain_percent": min_gain
+                },
+                "results": results,
+                "stats": totals['stats'],
+                "summary": totals['stats']['summary']
+            })
+    except Exception as e:
+        yield _ndjson({"type": "error", "detail": f"Backtest error: {str(e)}"})
+
+@app.get("/backtest/stream")
+async def get_backtest_stream(
+    tickers: str = Query(None, description="Comma-separated list of tickers. If not provided, uses default universe."),
+    period: str = Query("1y", description="Backtest period: 3mo, 6mo, 1y, 2y"),
+    min_gain: float = Query(5.0, description="Minimum gain percentage to count as success (e.g., 5.0 for 5%)")
+):
+    """Backtest as newline-delimited JSON, streaming per-ticker results and running totals"""
+    if tickers:
+        ticker_list = [ticker.strip().upper() for ticker in tickers.split(",") if ticker.strip()]
+    else:
+        ticker_list = await executor.run("data", data_loader.get_tickers, price_filter="All")
+
+    body, release = await executor.stream("backtest_stream", _stream_backtest(ticker_list, period, min_gain))
+    return StreamingResponse(body, media_type="application/x-ndjson", background=BackgroundTask(release))
+
+def _parse_grid(values, cast=float):
+    return [cast(v.strip()) for v in values.split(",") if v.strip()]
+
+@app.get("/backtest/sweep")
+async def get_backtest_sweep(
+    tickers: str = Query(None, description="Comma-separated list of tickers. If not provided, uses default universe."),
+    period: str = Query("1y", description="Backtest period: 3mo, 6mo, 1y, 2y"),
+    holds: str = Query("5", description="Comma-separated hold periods in bars (e.g., '3,5,10')"),
+    min_gains: str = Query("5.0", description="Comma-separated minimum gain percentages (e.g., '2,5')"),
+    risks: str = Query("1.0", description="Comma-separated risk per trade percentages (e.g., '0.5,1,2')"),
+    initial_balances: str = Query("10000", description="Comma-separated starting balances"),
+    rank_by: str = Query("win_rate", description="Ranking column: win_rate or total_return"),
+    top: int = Query(None, description="Only return the best N combinations")
+):
+    """Backtest every combination of the parameter grids in one pass, best first"""
+    try:
+        grids = {
+            "holds": _parse_grid(holds, int),
+            "min_gains": [g / 100 for g in _parse_grid(min_gains)],
+            "risk_per_trades": [r / 100 for r in _parse_grid(risks)],
+            "initial_balances": _parse_grid(initial_balances),
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid parameter grid: {e}")
+
+    if tickers:
+        ticker_list = [ticker.strip().upper() for ticker in tickers.split(",") if ticker.strip()]
+    else:
+        ticker_list = await executor.run("data", data_loader.get_tickers, price_filter="All")
+
+    try:
+        table, failed = await executor.run(
+            "sweep", sweep.run_sweep, ticker_list, period=period, rank_by=rank_by, top=top, **grids
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except executor.Overloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Sweep error: {str(e)}")
+
+    # Report percentages the way /backtest takes them
+    table = table.assign(
+        min_gain=(table["min_gain"] * 100).round(4),
+        risk_per_trade=(table["risk_per_trade"] * 100).round(4),
+    ).rename(columns={"min_gain": "min_gain_percent", "risk_per_trade": "risk_percent"})
+
+    return {
+        "status": "success",
+        "input_params": {
+            "tickers_count": len(ticker_list),
+            "period": period,
+            "combinations": len(grids["holds"]) * len(grids["min_gains"]) * len(grids["risk_per_trades"]) * len(grids["initial_balances"]),
+            "rank_by": rank_by
+        },
+        "failed_tickers": failed,
+        "results": table.to_dict("records")
+    }
+
+@app.get("/backtest/portfolio")
+async def get_backtest_portfolio(
+    tickers: str = Query(None, description="Comma-separated list of tickers. If not provided, uses default universe."),
+    period: str = Query("1y", description="Backtest period: 3mo, 6mo, 1y, 2y, 5y"),
+    hold: int = Query(5, description="Bars each position is held"),
+    initial_capital: float = Query(100000, description="Starting account value"),
+    position_size: float = Query(10.0, description="Percentage of equity put into each new position"),
+    max_positions: int = Query(10, description="Maximum concurrent open positions"),
+    max_position_value: float = Query(None, description="Cap on the amount invested per position")
+):
+    """Backtest all setups against one shared account, with an equity curve"""
+    if tickers:
+        ticker_list = [ticker.strip().upper() for ticker in tickers.split(",") if ticker.strip()]
+    else:
+        ticker_list = await executor.run("data", data_loader.get_tickers, price_filter="All")
+
+    try:
+        result = await executor.run(
+            "portfolio", portfolio.simulate_portfolio, ticker_list, period=period, hold=hold,
+            initial_capital=initial_capital, position_size=position_size / 100,
+            max_positions=max_positions, max_position_value=max_position_value
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except executor.Overloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Portfolio backtest error: {str(e)}")
+
+    equity = result['equity']
+    return {
+        "status": "success",
+        "input_params": {
+            "tickers_count": len(ticker_list),
+            "period": period,
+            "hold": hold,
+            "initial_capital": initial_capital,
+            "position_size_percent": position_size,
+            "max_positions": max_positions
+        },
+        "failed_tickers": result['failed'],
+        "stats": result['stats'],
+        "equity_curve": {
+            "dates": equity.index.strftime('%Y-%m-%d').tolist(),
+            "equity": equity.round(2).tolist()
+        },
+        "trades": result['trades'].to_dict('records')
+    }
+
+@app.get("/backtest/walkforward")
+async def get_backtest_walk_forward(
+    tickers: str = Query(None, description="Comma-separated list of tickers. If not provided, uses default universe."),
+    period: str = Query("5y", description="Full history to walk through: 2y, 5y, 10y, max"),
+    train_bars: int = Query(252, description="Training bars per window"),
+    test_bars: int = Query(63, description="Testing bars per window"),
+    step_bars: int = Query(None, description="Bars between window starts (default: test_bars)"),
+    holds: str = Query("5", description="Comma-separated hold periods; each window picks the best on its training part"),
+    risk: float = Query(1.0, description="Risk per trade percentage")
+):
+    """Rolling train/test backtest with per-window stats"""
+    try:
+        hold_grid = _parse_grid(holds, int)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid holds: {e}")
+
+    if tickers:
+        ticker_list = [ticker.strip().upper() for ticker in tickers.split(",") if ticker.strip()]
+    else:
+        ticker_list = await executor.run("data", data_loader.get_tickers, price_filter="All")
+
+    try:
+        windows, failed = await executor.run(
+            "walkforward", walk_forward.walk_forward, ticker_list, period=period, train_bars=train_bars,
+            test_bars=test_bars, step_bars=step_bars, holds=hold_grid, risk_per_trade=risk / 100
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except executor.Overloaded:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Walk-forward error: {str(e)}")
+
+    for window in windows:
+        for key in ("train_start", "train_end", "test_start", "test_end"):
+            window[key] = window[key].strftime("%Y-%m-%d")
+
+    return {
+        "status": "success",
+        "input_params": {
+            "tickers_count": len(ticker_list),
+            "period": period,
+            "train_bars": train_bars,
+            "test_bars": test_bars,
+            "step_bars": step_bars or test_bars
+        },
+        "failed_tickers": failed,
+        "windows": windows
+    }
+
+class SetupRule(BaseModel):
+    name: str
+    label: str
+    expression: str
+    score: int = 0
+    priority: Optional[int] = None
+
+@app.get("/setups")
+async def list_setups():
+    """List the active setup rules in priority order"""
+    return {
+        "status": "success",
+        "columns": sorted(set(rules.OHLCV) | set(rules.INDICATORS) | set(rules.DERIVED)),
+        "rules": [rule.to_dict() for rule in rules.get_rules().rules]
+    }
+
+def _check_setup_edits():
+    if not ALLOW_SETUP_EDITS:
+        raise HTTPException(status_code=403, detail="Setup rule edits are disabled (set ALLOW_SETUP_EDITS=1)")
+
+@app.post("/setups")
+async def add_setup(rule: SetupRule):
+    """Register a custom setup rule, e.g. {"name": "Oversold", "label": "Oversold setup", "expression": "RSI < 30 and Close > SMA_50"}"""
+    _check_setup_edits()
+    try:
+        added = rules.add_rule(rule.name, rule.label, rule.expression, score=rule.score, priority=rule.priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"status": "success", "rule": added.to_dict()}
+
+@app.delete("/setups/{name}")
+async def delete_setup(name: str):
+    """Remove a custom setup rule"""
+    _check_setup_edits()
+    try:
+        removed = rules.remove_rule(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"No setup rule named {name}")
+    return {"status": "success"}
+
+@app.get("/metrics")
+async def metrics():
+    """Queue depth, wait times and rejections per endpoint, plus request coalescing counters"""
+    return {
+        "executor": executor.stats(),
+        "single_flight": single_flight.stats()
+    }
+
 @app.get("/")
 async def root():
     """API health check"""
     return {
         "message": "Stock Scanner API is running",
         "version": "1.0.0",
-        "endpoints": ["/scan", "/summary", "/chart", "/backtest"]
+        "endpoints": ["/scan", "/summary", "/summaries", "/chart", "/charts", "/backtest", "/backtest/stream", "/backtest/sweep", "/backtest/walkforward", "/backtest/portfolio", "/setups", "/metrics"]
     }
 
 if __name__ == "__main__":
@@ -1,26 +1,92 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import numpy as np
 import pandas as pd
-import yfinance as yf
-from scanner.technicals import calculate_technicals, is_valid_setup
+from scanner import data_loader, indicators, result_cache, rules, technicals
+from scanner.technicals import calculate_technicals, is_valid_setup, latest_signals
 
-def backtest_strategy(df, setup_function, initial_balance=10000, risk_per_trade=0.01):
-    if df is None or df.empty or len(df) < 50:
+# Processes in the backtest pool; small universes stay serial since shipping
+# them to the pool costs more than it saves
+BACKTEST_WORKERS = int(os.getenv("BACKTEST_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_MIN_TICKERS = int(os.getenv("BACKTEST_PARALLEL_MIN_TICKERS", "50"))
+# Tickers loaded and backtested per step of a streamed backtest
+STREAM_BATCH_SIZE = int(os.getenv("BACKTEST_STREAM_BATCH_SIZE", "100"))
+
+HOLD_BARS = 5
+# Indicator rows backtest_strategy needs to simulate trades. A current setup
+# on a shorter history still counts as found, just without trades.
+MIN_BACKTEST_ROWS = 50
+
+def setup_signals(df):
+    """
+    Bars where is_valid_setup(df.iloc[:i+1]) is true, read straight from the
+    flag columns of calculate_technicals output.
+    """
+    signals = np.zeros(len(df), dtype=bool)
+    for rule in rules.get_rules().rules:
+        if rule.name in df.columns:
+            signals |= df[rule.name].to_numpy(dtype=bool)
+    signals[:29] = False  # is_valid_setup needs 30 rows
+    return signals
+
+def simulate_trades(close, signals, hold=HOLD_BARS, initial_balance=10000, risk_per_trade=0.01):
+    """
+    Vectorized core of backtest_strategy: every signal bar opens a trade that
+    exits `hold` bars later, sized at risk_per_trade of the running balance.
+    Returns entry/exit indices, pnl and balance-after arrays.
+    """
+    entries = np.flatnonzero(signals[:max(len(close) - hold, 0)])
+    exits = entries + hold
+    returns = close[exits] / close[entries] - 1
+    balance = initial_balance * np.cumprod(1 + risk_per_trade * returns)
+    balance_before = np.concatenate([[initial_balance], balance[:-1]])
+    pnl = balance_before * risk_per_trade * returns
+    return entries, exits, pnl, balance
+
+def backtest_strategy(df, setup_function=is_valid_setup, initial_balance=10000, risk_per_trade=0.01, hold=HOLD_BARS):
+    if df is None or df.empty or len(df) < MIN_BACKTEST_ROWS:
         return None
 
+    if setup_function is not is_valid_setup:
+        return _backtest_strategy_loop(df, setup_function, initial_balance, risk_per_trade, hold)
+
+    close = df['Close'].to_numpy(dtype=float)
+    entries, exits, pnl, balance = simulate_trades(
+        close, setup_signals(df), hold, initial_balance, risk_per_trade
+    )
+    if len(entries) == 0:
+        return pd.DataFrame()
+
+    return pd.DataFrame({
+        'entry_date': df.index[entries],
+        'exit_date': df.index[exits],
+        'entry_price': close[entries],
+        'exit_price': close[exits],
+        'pnl': pnl,
+        'balance': balance
+    })
+
+def _backtest_strategy_loop(df, setup_function, initial_balance=10000, risk_per_trade=0.01, hold=HOLD_BARS):
+    # Bar-by-bar replay for arbitrary setup functions
     balance = initial_balance
     trades = []
 
-    for i in range(len(df) - 5):
-        window = df.iloc[:i+1].copy()
+    for i in range(len(df) - hold):
+        window = df.iloc[:i+1]
         if setup_function(window):
             entry_price = df.iloc[i]['Close']
-            exit_price = df.iloc[i + 5]['Close']
+            exit_price = df.iloc[i + hold]['Close']
             position_size = balance * risk_per_trade / entry_price
             pnl = (exit_price - entry_price) * position_size
             balance += pnl
 
             trades.append({
                 'entry_date': df.index[i],
-                'exit_date': df.index[i + 5],
+                'exit_date': df.index[i + hold],
                 'entry_price': entry_price,
                 'exit_price': exit_price,
                 'pnl': pnl,
@@ -46,6 +112,9 @@ def summarize_backtest(results_df):
     max_drawdown = results_df['balance'].cummax() - results_df['balance']
     max_dd = max_drawdown.max()
 
+    return _format_stats(total_return, win_rate, avg_pnl, max_dd, len(results_df))
+
+def _format_stats(total_return, win_rate, avg_pnl, max_dd, total_trades):
     summary = (
         f"📈 In this period, the system grew your account by **${total_return:,.2f}**.\n"
         f"💰 **{win_rate*100:.1f}%** of trades made money.\n"
@@ -58,52 +127,378 @@ def summarize_backtest(results_df):
         'win_rate': round(win_rate * 100, 1),
         'avg_gain': round(avg_pnl, 2),
         'max_drawdown': round(max_dd, 2),
-        'total_trades': len(results_df),
+        'total_trades': total_trades,
         'summary': summary
     }
 
-def run_backtest(tickers, period="6mo", min_gain=0.05):
+class RunningStats:
+    """
+    summarize_backtest over trades that arrive a ticker at a time, without
+    keeping them: same figures as summarizing the concatenation.
+    """
+
+    def __init__(self):
+        self.trades = 0
+        self.wins = 0
+        self.pnl_sum = 0.0
+        self.first_balance = None
+        self.last_balance = None
+        self.peak = -np.inf
+        self.max_drawdown = 0.0
+
+    def update(self, results_df):
+        if results_df is None or results_df.empty:
+            return
+        pnl = results_df['pnl'].to_numpy(dtype=float)
+        balance = results_df['balance'].to_numpy(dtype=float)
+        self.trades += len(pnl)
+        self.wins += int((pnl > 0).sum())
+        self.pnl_sum += pnl.sum()
+        if self.first_balance is None:
+            self.first_balance = balance[0]
+        self.last_balance = balance[-1]
+        peaks = np.maximum.accumulate(np.maximum(balance, self.peak))
+        self.max_drawdown = max(self.max_drawdown, (peaks - balance).max())
+        self.peak = peaks[-1]
+
+    def summary(self):
+        if not self.trades:
+            return summarize_backtest(None)
+        return _format_stats(
+            self.last_balance - self.first_balance, self.wins / self.trades,
+            self.pnl_sum / self.trades, self.max_drawdown, self.trades,
+        )
+
+def screen_setup(df):
+    """
+    (setup_found, technicals) for one ticker, as run_backtest and sweeps count
+    it: only tickers with a current setup are backtested, and technicals is
+    None when the history is too short to simulate trades on.
+    """
+    # Screen on the latest bar before paying for the full history
+    signals = latest_signals(df)
+    if not signals or not signals[-1]["valid"]:
+        return False, None
+
+    df = calculate_technicals(df)
+    if len(df) < MIN_BACKTEST_ROWS:
+        return True, None
+    return True, df
+
+def _backtest_ticker(df, **params):
+    """
+    (setup_found, trades) for one ticker; only current setups are backtested.
+    params are passed through to backtest_strategy.
+    """
+    found, df = screen_setup(df)
+    if df is None:
+        return found, None
+    return True, backtest_strategy(df, is_valid_setup, **params)
+
+def _run_serial(frames, params):
+    results = {}
+    for ticker, df in frames.items():
+        try:
+            if df is not None and not df.empty:
+                results[ticker] = _backtest_ticker(df, **params)
+        except Exception:
+            continue
+    return results
+
+# One process pool shared by every parallel backtest (run_backtest and each
+# batch of iter_backtest), started on first use and kept for the life of the
+# process. Workers come from a forkserver (spawn where that isn't available)
+# instead of fork(), so they never inherit locks held by the API's threads.
+_pool = None
+_pool_lock = threading.Lock()
+
+def _start_method():
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=max(BACKTEST_WORKERS, 1),
+                mp_context=multiprocessing.get_context(_start_method()),
+            )
+        return _pool
+
+def _discard_pool(pool):
+    # A worker died; the next run starts a fresh pool
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _sync_rules(active):
+    """Make a worker's rule registry match the parent's, in the same order."""
+    current = [rule.to_dict() for rule in rules.get_rules().rules]
+    if current == active:
+        return
+    for rule in current:
+        if not rule['builtin']:
+            rules.remove_rule(rule['name'])
+    for position, rule in enumerate(active):
+        if not rule['builtin']:
+            rules.add_rule(rule['name'], rule['label'], rule['expression'], score=rule['score'], priority=position)
+
+def _backtest_columns(task):
+    """
+    Worker task: backtest a batch of columns of the shared price panel,
+    returning plain arrays. The panel is mapped for the task only.
+    """
+    shm_name, shape, dates, active_rules, params, columns = task
+    _sync_rules(active_rules)
+    # Workers share the parent's resource tracker, so the parent's unlink()
+    # is the only cleanup needed
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        return _backtest_panel(np.ndarray(shape, dtype=np.float64, buffer=shm.buf), dates, params, columns)
+    finally:
+        shm.close()
+
+def _backtest_panel(panel, dates, params, columns):
+    out = []
+    for j in columns:
+        block = panel[:, :, j]
+        rows = np.flatnonzero(~np.isnan(block).all(axis=0))
+        df = pd.DataFrame(block[:, rows].T, index=dates[rows], columns=technicals.PANEL_FIELDS)
+        try:
+            found, trades = _backtest_ticker(df, **params)
+        except Exception:
+            continue
+        if trades is None or trades.empty:
+            out.append((j, found, None))
+            continue
+        out.append((j, found, {
+            'entry_row': dates.get_indexer(trades['entry_date']),
+            'exit_row': dates.get_indexer(trades['exit_date']),
+            'entry_price': trades['entry_price'].to_numpy(),
+            'exit_price': trades['exit_price'].to_numpy(),
+            'pnl': trades['pnl'].to_numpy(),
+            'balance': trades['balance'].to_numpy(),
+        }))
+    return out
+
+def _run_parallel(frames, workers, params):
+    """
+    Backtest every ticker on the shared process pool. The aligned OHLCV panel
+    lives in one shared-memory block that workers map directly, so no
+    DataFrames are pickled; each worker sends back only its trade arrays.
+    Frames a panel can't hold (duplicate dates, missing columns, ...) are
+    backtested serially instead, so results don't depend on the worker count.
+    """
+    panel = technicals.build_panel({
+        ticker: df for ticker, df in frames.items() if not technicals.panel_problem(df)
+    })
+    tickers, dates = panel['tickers'], panel['dates']
+    placed = set(tickers)
+    serial = {ticker: df for ticker, df in frames.items() if ticker not in placed}
+    stacked = np.stack([panel[field] for field in technicals.PANEL_FIELDS])
+
+    shm = shared_memory.SharedMemory(create=True, size=max(stacked.nbytes, 1))
+    try:
+        np.ndarray(stacked.shape, dtype=np.float64, buffer=shm.buf)[:] = stacked
+        del stacked, panel
+        active_rules = [rule.to_dict() for rule in rules.get_rules().rules]
+        shape = (len(technicals.PANEL_FIELDS), len(dates), len(tickers))
+
+        batch = max(1, len(tickers) // (workers * 4))
+        tasks = [
+            (shm.name, shape, dates, active_rules, params, range(i, min(i + batch, len(tickers))))
+            for i in range(0, len(tickers), batch)
+        ]
+        results = {}
+        pool = _get_pool()
+        try:
+            chunks = list(pool.map(_backtest_columns, tasks))
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            raise
+        for chunk in chunks:
+            for j, found, arrays in chunk:
+                trades = None
+                if arrays is not None:
+                    trades = pd.DataFrame({
+                        'entry_date': dates[arrays['entry_row']],
+                        'exit_date': dates[arrays['exit_row']],
+                        'entry_price': arrays['entry_price'],
+                        'exit_price': arrays['exit_price'],
+                        'pnl': arrays['pnl'],
+                        'balance': arrays['balance'],
+                    })
+                results[tickers[j]] = (found, trades)
+        results.update(_run_serial(serial, params))
+        return results
+    finally:
+        shm.close()
+        shm.unlink()
+
+# Per-ticker trades and whole run_backtest results, keyed by data versions
+_ticker_cache = result_cache.ResultCache("tickers")
+_run_cache = result_cache.ResultCache("runs")
+
+def _data_fingerprint(ticker, df):
+    # Stored-bars version plus the slice the period selected from them
+    return (data_loader.get_data_version(ticker), str(df.index[0]), len(df))
+
+def _clean_tickers(tickers):
+    # Caller's order (and repeats) kept: the aggregate stats depend on it
+    return [ticker.strip().upper() for ticker in tickers if ticker.strip()]
+
+def _ticker_keys(frames, params_key):
+    return {
+        ticker: result_cache.make_key(ticker, _data_fingerprint(ticker, df), params_key)
+        for ticker, df in frames.items()
+    }
+
+def _backtest_frames(frames, ticker_keys, params, workers):
+    """
+    (setup_found, trades) per ticker, reusing cached results where the data
+    and parameters are unchanged.
+    """
+    results = {}
+    missing = {}
+    for ticker, df in frames.items():
+        hit = _ticker_cache.get(ticker_keys[ticker])
+        if hit is not None:
+            results[ticker] = hit
+        else:
+            missing[ticker] = df
+
+    workers = BACKTEST_WORKERS if workers is None else workers
+    if workers > 1 and len(missing) >= PARALLEL_MIN_TICKERS:
+        fresh = _run_parallel(missing, workers, params)
+    else:
+        fresh = _run_serial(missing, params)
+    for ticker, result in fresh.items():
+        _ticker_cache.put(ticker_keys[ticker], result)
+    results.update(fresh)
+    return results
+
+def _load_frames(tickers, period):
+    frames, failed = data_loader.get_data_many(tickers, period=period, interval="1d")
+    frames = {ticker: df for ticker, df in frames.items() if df is not None and not df.empty}
+    return frames, failed
+
+def run_backtest(tickers, period="6mo", min_gain=0.05, workers=None,
+                 hold=HOLD_BARS, risk_per_trade=0.01, initial_balance=10000):
+    """
+    Backtest current setups across `tickers`; trades are aggregated in the
+    order given. Results are cached per ticker and per run, keyed by the data
+    versions of the bars used, so repeated calls only backtest tickers whose
+    data changed (or that weren't seen before).
+    """
+    tickers = _clean_tickers(tickers)
     all_trades = []
     setups_found = 0
     successful = 0
 
-    for ticker in tickers:
-        try:
-            df = yf.download(ticker, period=period, interval="1d", progress=False)
-            if df.empty:
-                continue
+    frames, failed = _load_frames(tickers, period)
 
-            df = calculate_technicals(df)
-            if not is_valid_setup(df):
-                continue
+    params = {"hold": hold, "risk_per_trade": risk_per_trade, "initial_balance": initial_balance}
+    params_key = (period, hold, risk_per_trade, initial_balance, MIN_BACKTEST_ROWS, rules.fingerprint(), indicators.FORMULA_VERSION)
+    ticker_keys = _ticker_keys(frames, params_key)
+    # Per-ticker keys are sorted, the ticker list is not: the same tickers in
+    # another order give another total return and drawdown
+    run_key = result_cache.make_key(
+        tickers, min_gain, params_key, sorted(ticker_keys.values()), sorted(failed)
+    )
+    cached = _run_cache.get(run_key)
+    if cached is not None:
+        return cached
 
-            setups_found += 1
-            result = backtest_strategy(df, is_valid_setup)
-            if result is not None and not result.empty:
-                all_trades.append(result)
-                last_trade = result.iloc[-1]
-                if last_trade["pnl"] > min_gain * 10000:  # 1% of 10k
-                    successful += 1
-        except Exception:
+    results = _backtest_frames(frames, ticker_keys, params, workers)
+
+    for ticker in tickers:
+        if ticker not in results:
             continue
+        found, result = results[ticker]
+        if not found:
+            continue
+
+        setups_found += 1
+        if result is not None and not result.empty:
+            all_trades.append(result)
+            last_trade = result.iloc[-1]
+            if last_trade["pnl"] > min_gain * initial_balance:
+                successful += 1
 
     if not all_trades:
-        return {
+        summary = {
             'total': len(tickers),
             'setups_found': 0,
             'successful': 0,
             'summary': "No valid setups found during backtest.",
-            'details': pd.DataFrame()
+            'details': pd.DataFrame(),
+            'failed': sorted(failed)
         }
+        _run_cache.put(run_key, summary)
+        return summary
 
     trades_df = pd.concat(all_trades)
     stats = summarize_backtest(trades_df)
 
-    return {
+    summary = {
         'total': len(tickers),
         'setups_found': setups_found,
         'successful': successful,
         'summary': stats["summary"],
         'details': trades_df,
-        'stats': stats
+        'stats': stats,
+        'failed': sorted(failed)
     }
+    _run_cache.put(run_key, summary)
+    return summary
+
+def iter_backtest(tickers, period="6mo", min_gain=0.05, workers=None,
+                  hold=HOLD_BARS, risk_per_trade=0.01, initial_balance=10000,
+                  batch_size=None):
+    """
+    Streaming run_backtest: loads and backtests `batch_size` tickers at a
+    time and yields events as they complete, keeping only running totals.
+
+    Yields ("ticker", ticker, trades, successful) for each ticker with
+    a current setup, ("progress", totals) after every batch and finally
+    ("done", totals). The final totals match run_backtest's counts and stats.
+    """
+    tickers = _clean_tickers(tickers)
+    batch_size = batch_size or STREAM_BATCH_SIZE
+    params = {"hold": hold, "risk_per_trade": risk_per_trade, "initial_balance": initial_balance}
+    params_key = (period, hold, risk_per_trade, initial_balance, MIN_BACKTEST_ROWS, rules.fingerprint(), indicators.FORMULA_VERSION)
+
+    running = RunningStats()
+    totals = {'total': len(tickers), 'processed': 0, 'setups_found': 0, 'successful': 0, 'failed': []}
+
+    for start in range(0, len(tickers), batch_size):
+        batch = tickers[start:start + batch_size]
+        frames, failed = _load_frames(batch, period)
+        results = _backtest_frames(frames, _ticker_keys(frames, params_key), params, workers)
+        del frames
+
+        for ticker in batch:
+            if ticker not in results or not results[ticker][0]:
+                continue
+            _, trades = results[ticker]
+            won = False
+            totals['setups_found'] += 1
+            if trades is not None and not trades.empty:
+                running.update(trades)
+                won = bool(trades['pnl'].iloc[-1] > min_gain * initial_balance)
+                totals['successful'] += won
+            yield ("ticker", ticker, trades, won)
+
+        totals['processed'] += len(batch)
+        totals['failed'] = sorted(totals['failed'] + list(failed))
+        totals['stats'] = running.summary()
+        yield ("progress", dict(totals))
+
+    if not running.trades:
+        # Same convention as run_backtest
+        totals['setups_found'] = 0
+        totals['successful'] = 0
+    totals['stats'] = running.summary()
+    yield ("done", dict(totals))
@@ -0,0 +1,159 @@
+import json
+import numpy as np
+import pyarrow as pa
+
+# /chart payloads built straight from the indicator arrays. Long histories can
+# be reduced with LTTB (largest triangle three buckets), which keeps the bars
+# that shape the close line (peaks, troughs, breakouts) rather than every
+# n-th one. The same bars are kept for every series so candles, averages and
+# RSI stay aligned.
+#
+# Formats:
+#   "json"    the original row-shaped payload (a dict per candle)
+#   "columns" one JSON array per series
+#   "arrow"   Arrow IPC stream, one column per series
+#   "float32" raw little-endian arrays: int32 days since 1970-01-01, then one
+#             float32 array per series in the order of the X-Chart-Columns
+#             header (NaN where a value is missing)
+
+FORMATS = ("json", "columns", "arrow", "float32")
+
+SERIES = ("open", "high", "low", "close", "volume", "sma_20", "sma_50", "rsi")
+SOURCE_COLUMNS = {
+    "open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume",
+    "sma_20": "SMA_20", "sma_50": "SMA_50", "rsi": "RSI",
+}
+# Decimals kept in the JSON formats, as in the original payload
+DECIMALS = {"open": 2, "high": 2, "low": 2, "close": 2, "sma_20": 2, "sma_50": 2, "rsi": 1}
+
+
+def lttb_indices(y, n_out):
+    """
+    Positions of the `n_out` points LTTB keeps from the series `y` (x is the
+    bar number). The first and last points are always kept.
+    """
+    n = len(y)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError("max_points must be at least 3")
+
+    y = np.asarray(y, dtype=float)
+    x = np.arange(n, dtype=float)
+    # n_out - 2 buckets between the fixed first and last points
+    bounds = np.append((np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(int) + 1, n)
+    out = np.empty(n_out, dtype=int)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        next_lo, next_hi = bounds[i + 1], bounds[i + 2]
+        avg_x, avg_y = x[next_lo:next_hi].mean(), y[next_lo:next_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def chart_arrays(df, max_points=None):
+    """
+    Chart series of a calculate_technicals frame as arrays ('dates' plus
+    SERIES), downsampled to `max_points` bars when given.
+    """
+    keep = slice(None)
+    if max_points is not None:
+        keep = lttb_indices(df['Close'].to_numpy(dtype=float), max_points)
+
+    # Wall-clock dates, as strftime on the original index would give
+    index = df.index.tz_localize(None) if df.index.tz is not None else df.index
+    arrays = {"dates": index.values[keep]}
+    for name in SERIES:
+        column = SOURCE_COLUMNS[name]
+        if column in df.columns:
+            arrays[name] = df[column].to_numpy(dtype=float)[keep]
+        else:
+            arrays[name] = np.full(len(arrays["dates"]), np.nan)
+    return arrays
+
+
+def _rounded(values, decimals):
+    rounded = np.round(values, decimals).tolist()
+    if np.isnan(values).any():
+        rounded = [None if v != v else v for v in rounded]
+    return rounded
+
+
+def _dates(arrays):
+    return np.datetime_as_string(arrays["dates"], unit="D").tolist()
+
+
+def rows_payload(ticker, arrays):
+    """The original /chart payload: one dict per candle, indicators as arrays."""
+    opens, highs, lows, closes = (_rounded(arrays[name], 2) for name in ("open", "high", "low", "close"))
+    volumes = arrays["volume"].astype(np.int64).tolist()
+    return {
+        "ticker": ticker,
+        "dates": _dates(arrays),
+        "candles": [
+            {"open": o, "high": h, "low": l, "close": c, "volume": v}
+            for o, h, l, c, v in zip(opens, highs, lows, closes, volumes)
+        ],
+        "sma_20": _rounded(arrays["sma_20"], 2),
+        "sma_50": _rounded(arrays["sma_50"], 2),
+        "rsi": _rounded(arrays["rsi"], 1),
+    }
+
+
+def columns_payload(ticker, arrays):
+    """One array per series; the compact JSON layout."""
+    payload = {"ticker": ticker, "dates": _dates(arrays)}
+    for name in SERIES:
+        if name == "volume":
+            payload[name] = arrays[name].astype(np.int64).tolist()
+        else:
+            payload[name] = _rounded(arrays[name], DECIMALS[name])
+    return payload
+
+
+def to_arrow(ticker, arrays):
+    """Arrow IPC stream bytes; the ticker is in the schema metadata."""
+    columns = {"date": pa.array(arrays["dates"].astype("datetime64[D]"), type=pa.date32())}
+    for name in SERIES:
+        values = arrays[name]
+        if name == "volume":
+            columns[name] = pa.array(values.astype(np.int64))
+        else:
+            columns[name] = pa.array(values, mask=np.isnan(values))
+    table = pa.table(columns).replace_schema_metadata({"ticker": ticker})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def to_float32(arrays):
+    """Packed little-endian day numbers and float32 series (see module notes)."""
+    days = arrays["dates"].astype("datetime64[D]").astype("<i4")
+    series = np.stack([arrays[name] for name in SERIES]).astype("<f4")
+    return days.tobytes() + series.tobytes()
+
+
+def render(ticker, arrays, fmt="json"):
+    """(body bytes, media type, extra headers) for one chart in format `fmt`."""
+    if fmt == "json":
+        return encode_json(rows_payload(ticker, arrays)), "application/json", {}
+    if fmt == "columns":
+        return encode_json(columns_payload(ticker, arrays)), "application/json", {}
+    headers = {"X-Chart-Ticker": ticker, "X-Chart-Points": str(len(arrays["dates"]))}
+    if fmt == "arrow":
+        return to_arrow(ticker, arrays), "application/vnd.apache.arrow.stream", headers
+    if fmt == "float32":
+        headers["X-Chart-Columns"] = ",".join(SERIES)
+        return to_float32(arrays), "application/octet-stream", headers
+    raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+
+
+def encode_json(payload):
+    # The payload is plain lists of numbers and strings already, so the C
+    # encoder handles it directly; compact like Starlette's JSONResponse
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, allow_nan=False).encode("utf-8")
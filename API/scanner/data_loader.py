@@ -1,24 +1,246 @@
 import pandas as pd
-import yfinance as yf
-import requests
+import os
 import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from scanner import price_store, providers, single_flight
 
-def get_data(ticker, period="6mo", interval="1d"):
-    df = yf.download(ticker, period=period, interval=interval, progress=False)
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", "50"))
+BULK_MAX_WORKERS = int(os.getenv("BULK_MAX_WORKERS", "4"))
+# Longest history kept per interval; yfinance caps intraday lookback
+HISTORY_PERIODS = {
+    "1d": os.getenv("DAILY_HISTORY_PERIOD", "2y"),
+    "1h": "730d", "60m": "730d", "90m": "60d", "30m": "60d",
+    "15m": "60d", "5m": "60d", "2m": "60d", "1m": "7d",
+}
+SCREENER_TTL_SECONDS = int(os.getenv("SCREENER_TTL_SECONDS", "3600"))
+
+# The API and Streamlit app pass their UI labels straight through
+PRICE_FILTER_ALIASES = {"under $50": "under_50", "over $50": "over_50"}
+
+_screener = {"table": None, "fetched_at": 0.0, "refreshing": False}
+_screener_lock = threading.Lock()
+
+PERIOD_UNIT_DAYS = {"d": 1, "wk": 7, "mo": 31, "y": 366}
+
+def _period_days(period):
+    """Upper bound in calendar days of a yfinance period string."""
+    if period == "ytd":
+        return 366
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period or "")
+    if not match:
+        return float("inf")
+    return int(match.group(1)) * PERIOD_UNIT_DAYS[match.group(2)]
+
+def _period_start(df, period):
     if df.empty:
-        return pd.DataFrame()
-    df = df.copy()
-    df.columns.name = None
+        return None
+    now = providers.get_provider().now()
+    if df.index.tz is not None:
+        now = now.tz_localize(df.index.tz) if now.tzinfo is None else now.tz_convert(df.index.tz)
+    return providers.period_start(now, period)
+
+def _download(ticker, interval, period=None, start=None):
+    return _download_many([ticker], interval, period=period, start=start).get(ticker, pd.DataFrame())
+
+def _download_many(tickers, interval, period=None, start=None):
+    """One bulk request for several tickers, split back into per-ticker frames."""
+    return providers.get_provider().download(tickers, interval=interval, period=period, start=start)
+
+def _history_period(period, interval):
+    """
+    Period actually kept in the store: at least HISTORY_PERIODS[interval], so
+    every shorter request for the same ticker is a slice of one download.
+    """
+    base = HISTORY_PERIODS.get(interval)
+    if base is None or _period_days(period) >= _period_days(base):
+        return period
+    return base
+
+def _stored_history(ticker, period, interval):
+    """Stored bars plus whether they reach back as far as `period`."""
+    stored = price_store.read(ticker, interval)
+    stored_period = price_store.stored_period(ticker, interval)
+    covered = (
+        not stored.empty
+        and stored_period is not None
+        and _period_days(stored_period) >= _period_days(period)
+    )
+    return stored, covered
+
+def _merge_into_store(ticker, interval, period, stored, covered, df):
+    if covered:
+        return price_store.append(ticker, interval, stored, df)
+    if df.empty:
+        return stored
+    if not stored.empty:
+        df = pd.concat([stored[stored.index < df.index[0]], df])
+    price_store.write(ticker, interval, df, period=period)
+    return df
+
+def _load_history(ticker, period, interval):
+    """
+    Serve bars from the local price store, only asking upstream for what is
+    missing: nothing while the entry is fresh, the bars since the last stored
+    one when it is stale, and the full period when the store is too short.
+    """
+    stored, covered = _stored_history(ticker, period, interval)
+    if covered and price_store.is_fresh(ticker, interval):
+        return stored
 
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.droplevel(1)
+    try:
+        if covered:
+            df = _download(ticker, interval, start=stored.index[-1])
+        else:
+            df = _download(ticker, interval, period=period)
+        return _merge_into_store(ticker, interval, period, stored, covered, df)
+    except Exception as e:
+        if stored.empty:
+            raise
+        print(f"⚠️ Refresh failed for {ticker}, serving stored bars: {e}")
+        return stored
 
+def _slice_period(df, period, starts=None):
+    """
+    Positional slice of the stored history (no copy of the bars), so callers
+    must treat the result as read-only. `starts` memoizes the period start
+    per timezone across the frames of one bulk load.
+    """
+    if re.fullmatch(r"\d+d", period):
+        # Day periods count trading sessions, like yfinance does
+        sessions = df.index.normalize()
+        start = sessions.unique()[-_period_days(period):][0]
+    elif starts is None or df.empty:
+        start = _period_start(df, period)
+    else:
+        tz = str(df.index.tz)
+        if tz not in starts:
+            starts[tz] = _period_start(df, period)
+        start = starts[tz]
+    if start is None:
+        return df
+    return df.iloc[df.index.searchsorted(start, side="left"):]
+
+def _check_columns(df):
     required = ["Close", "High", "Low"]
     if not all(col in df.columns for col in required):
         raise ValueError(f"Missing columns: {required}")
 
+# Concurrent get_data calls for the same stored history share one load
+_history_flight = single_flight.SingleFlight("history")
+
+def get_data(ticker, period="6mo", interval="1d"):
+    history = _history_period(period, interval)
+    df = _history_flight.do((ticker, history, interval), _load_history, ticker, history, interval)
+    if df.empty:
+        return pd.DataFrame()
+
+    df = _slice_period(df, period)
+    _check_columns(df)
     return df
 
+def _fetch_chunk(chunk, period, interval):
+    """
+    Bring one chunk of tickers up to date with a single bulk request.
+    Returns (frames, failed) like get_data_many.
+    """
+    frames, failed = {}, {}
+    pending = {}
+    for ticker in chunk:
+        stored, covered = _stored_history(ticker, period, interval)
+        if covered and price_store.is_fresh(ticker, interval):
+            frames[ticker] = stored
+        else:
+            pending[ticker] = (stored, covered)
+
+    # Stale tickers only need the bars since their oldest last stored bar;
+    # tickers with no (or too short) history need the whole period.
+    updates = [t for t, (_, covered) in pending.items() if covered]
+    full = [t for t, (_, covered) in pending.items() if not covered]
+    batches = []
+    if updates:
+        start = min(pending[t][0].index[-1] for t in updates)
+        batches.append((updates, {"start": start}))
+    if full:
+        batches.append((full, {"period": period}))
+
+    for group, kwargs in batches:
+        try:
+            downloaded = _download_many(group, interval, **kwargs)
+        except Exception as e:
+            downloaded = None
+            error = str(e)
+
+        for ticker in group:
+            stored, covered = pending[ticker]
+            if downloaded is None:
+                if stored.empty:
+                    failed[ticker] = error
+                else:
+                    frames[ticker] = stored
+                continue
+
+            try:
+                df = _merge_into_store(
+                    ticker, interval, period, stored, covered,
+                    downloaded.get(ticker, pd.DataFrame()),
+                )
+            except Exception as e:
+                # e.g. the price store could not be written: only this ticker fails
+                failed[ticker] = str(e)
+                continue
+            if df.empty:
+                failed[ticker] = "No data returned"
+            else:
+                frames[ticker] = df
+
+    return frames, failed
+
+def get_data_many(tickers, period="6mo", interval="1d", chunk_size=None, max_workers=None):
+    """
+    Bulk version of get_data. Tickers are split into chunks that are fetched
+    in parallel, one request per chunk.
+
+    Returns (frames, failed): frames maps ticker -> DataFrame in the same shape
+    get_data returns, failed maps ticker -> reason it could not be loaded.
+    """
+    chunk_size = chunk_size or BULK_CHUNK_SIZE
+    max_workers = max_workers or BULK_MAX_WORKERS
+    tickers = list(dict.fromkeys(tickers))
+    chunks = [tickers[i:i + chunk_size] for i in range(0, len(tickers), chunk_size)]
+    history = _history_period(period, interval)
+
+    frames, failed, starts = {}, {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for chunk_frames, chunk_failed in pool.map(lambda c: _fetch_chunk(c, history, interval), chunks):
+            failed.update(chunk_failed)
+            for ticker, df in chunk_frames.items():
+                try:
+                    df = _slice_period(df, period, starts)
+                    _check_columns(df)
+                except Exception as e:
+                    failed[ticker] = str(e)
+                    continue
+                frames[ticker] = df
+
+    if failed:
+        print(f"⚠️ Failed to load {len(failed)} of {len(tickers)} tickers")
+    return frames, failed
+
+def get_data_version(ticker, interval="1d"):
+    """Version of the stored bars for a ticker; use it to key derived caches."""
+    return price_store.get_version(ticker, interval)
+
+def get_fresh_data_version(ticker, interval="1d"):
+    """
+    Version of the stored bars if get_data would serve them without asking
+    upstream, else None (the next get_data may bring new bars).
+    """
+    if not price_store.is_fresh(ticker, interval):
+        return None
+    return price_store.get_version(ticker, interval) or None
+
 def parse_price(price_str):
     try:
         if not price_str or price_str == "N/A":
@@ -27,46 +249,104 @@ def parse_price(price_str):
     except:
         return None
 
+def _fetch_exchange(ex):
+    print(f"🌐 Fetching from {ex.upper()}...")
+    try:
+        return providers.get_provider().get_screener_rows(ex)
+    except Exception as e:
+        print(f"⚠️ Failed to fetch from {ex.upper()}: {e}")
+        return []
+
 def get_all_screener_data():
     exchanges = ["nasdaq", "nyse", "amex"]
     all_rows = []
 
-    for ex in exchanges:
-        print(f"🌐 Fetching from {ex.upper()}...")
-        url = f"https://api.nasdaq.com/api/screener/stocks?tableonly=true&limit=5000&exchange={ex}"
-        headers = {"User-Agent": "Mozilla/5.0"}
-        try:
-            r = requests.get(url, headers=headers)
-            r.raise_for_status()
-            data = r.json()
-            rows = data["data"]["table"]["rows"]
+    with ThreadPoolExecutor(max_workers=len(exchanges)) as pool:
+        for rows in pool.map(_fetch_exchange, exchanges):
             all_rows.extend(rows)
-        except Exception as e:
-            print(f"⚠️ Failed to fetch from {ex.upper()}: {e}")
 
     return pd.DataFrame(all_rows)
 
+def _build_screener_table(raw):
+    """Symbol/Price table sorted by ascending price, so price filters are slices."""
+    df = raw.rename(columns={"symbol": "Symbol", "lastsale": "LastSale"})
+    prices = df["LastSale"].astype(str).str.replace(r"[^\d.]", "", regex=True)
+    df["Price"] = pd.to_numeric(prices, errors="coerce")
+    df = df[["Symbol", "Price"]].dropna()
+    df = df[df["Price"] > 0]
+    return df.sort_values("Price", kind="stable").reset_index(drop=True)
+
+def _refresh_screener():
+    table = _build_screener_table(get_all_screener_data())
+    if table.empty:
+        raise ValueError("Screener returned no rows")
+
+    with _screener_lock:
+        _screener["table"] = table
+        _screener["fetched_at"] = time.time()
+    try:
+        table.to_parquet(price_store.store_path("screener.parquet"))
+    except Exception as e:
+        print(f"⚠️ Could not persist screener snapshot: {e}")
+    return table
+
+def _refresh_screener_in_background():
+    with _screener_lock:
+        if _screener["refreshing"]:
+            return
+        _screener["refreshing"] = True
+
+    def run():
+        try:
+            _refresh_screener()
+        except Exception as e:
+            print(f"⚠️ Background screener refresh failed: {e}")
+        finally:
+            with _screener_lock:
+                _screener["refreshing"] = False
+
+    threading.Thread(target=run, daemon=True).start()
+
+def get_screener_table():
+    """
+    Cached screener snapshot (memory, then disk). A stale snapshot is still
+    returned immediately while a background thread fetches a new one; only
+    a cold start waits on the network.
+    """
+    with _screener_lock:
+        table, fetched_at = _screener["table"], _screener["fetched_at"]
+
+    if table is None:
+        path = price_store.store_path("screener.parquet")
+        if os.path.exists(path):
+            table, fetched_at = pd.read_parquet(path), os.path.getmtime(path)
+            with _screener_lock:
+                _screener["table"], _screener["fetched_at"] = table, fetched_at
+
+    if table is None:
+        return _refresh_screener()
+    if time.time() - fetched_at > SCREENER_TTL_SECONDS:
+        _refresh_screener_in_background()
+    return table
+
 def get_tickers(price_filter="all", limit=500):
     """
     Loads tickers from NASDAQ, NYSE, and AMEX.
     Filters by price using screener's 'lastsale' field.
+    limit=None returns every matching ticker.
     """
     try:
-        df = get_all_screener_data()
-        df = df.rename(columns={"symbol": "Symbol", "lastsale": "LastSale"})
-        df["Price"] = df["LastSale"].apply(parse_price)
-        df = df[["Symbol", "Price"]].dropna()
-        df = df[df["Price"] > 0]
-
-        # Apply price filter
-        price_filter = price_filter.lower()
+        df = get_screener_table()
+
+        # Apply price filter; the table is sorted by price so this is a slice
+        price_filter = PRICE_FILTER_ALIASES.get(price_filter.lower(), price_filter.lower())
+        cut = df["Price"].searchsorted(50, side="left")
         if price_filter == "under_50":
-            df = df[df["Price"] < 50]
+            df = df.iloc[:cut]
         elif price_filter == "over_50":
-            df = df[df["Price"] >= 50]
+            df = df.iloc[cut:]
 
-        df = df.sort_values("Price", ascending=False)
-        final = df["Symbol"].head(limit).tolist()
+        final = df["Symbol"].iloc[::-1].head(limit).tolist()
         print(f"✅ Returning {len(final)} tickers in price range: {price_filter}")
         return final
 
@@ -0,0 +1,260 @@
+import os
+import math
+import time
+import asyncio
+import functools
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Compute executor for the API. Blocking work (downloads, pandas, LLM calls)
+# runs on dedicated pools instead of the event loop, and each endpoint has
+# its own admission limits: up to `concurrency` calls run at once, up to
+# `queue` more wait for a slot, and anything beyond that is turned away
+# immediately (429) rather than queued behind work it cannot overtake. A call
+# that waits longer than `timeout` seconds for a slot gives up with 503.
+#
+# Pools: "io" threads for network-bound work, "cpu" threads sized to the
+# machine for pandas/numpy work, and "process" for endpoints configured to
+# run out of process. Work sent to "process" must be picklable and does not
+# see in-process state such as custom setup rules or the price store LRU,
+# so no endpoint uses it by default.
+
+IO_WORKERS = int(os.getenv("EXECUTOR_IO_WORKERS", "32"))
+CPU_WORKERS = int(os.getenv("EXECUTOR_CPU_WORKERS", str(os.cpu_count() or 4)))
+PROCESS_WORKERS = int(os.getenv("EXECUTOR_PROCESS_WORKERS", str(os.cpu_count() or 4)))
+# Overrides of DEFAULT_LIMITS, e.g. "scan=cpu:8:32:10,summary=io:4:8:60"
+# (pool:concurrency:queue:timeout per endpoint)
+LIMITS = os.getenv("EXECUTOR_LIMITS", "")
+
+DEFAULT_LIMITS = {
+    "data": ("io", 8, 64, 10),
+    "scan": ("cpu", 4, 16, 10),
+    "chart": ("io", 16, 64, 5),
+    "summary": ("io", 8, 32, 30),
+    "charts": ("io", 4, 16, 10),
+    "summaries": ("io", 2, 8, 60),
+    "backtest": ("cpu", 2, 8, 30),
+    "backtest_stream": ("cpu", 2, 4, 30),
+    "sweep": ("cpu", 1, 4, 30),
+    "portfolio": ("cpu", 1, 4, 30),
+    "walkforward": ("cpu", 1, 4, 30),
+}
+
+# Recent waits kept per endpoint for the percentiles in stats()
+WAIT_SAMPLES = 512
+
+
+class Overloaded(Exception):
+    """Call rejected by admission control; `status` is 429 or 503."""
+
+    def __init__(self, endpoint, status, retry_after, reason):
+        super().__init__(f"{endpoint} is overloaded: {reason}")
+        self.endpoint = endpoint
+        self.status = status
+        self.retry_after = retry_after
+
+
+class _Lane:
+    def __init__(self, name, pool, concurrency, queue, timeout):
+        if pool not in ("io", "cpu", "process"):
+            raise ValueError(f"Unknown executor pool for {name}: {pool}")
+        self.name = name
+        self.pool = pool
+        self.concurrency = max(1, int(concurrency))
+        self.max_queue = max(0, int(queue))
+        self.timeout = float(timeout)
+        self.running = 0
+        self._waiters = deque()
+        self.admitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._service = None
+
+    def retry_after(self):
+        """Seconds until a slot is likely free, from the recent service time."""
+        service = self._service or 1.0
+        return max(1, math.ceil(service * (len(self._waiters) + 1) / self.concurrency))
+
+    async def acquire(self):
+        arrived = time.monotonic()
+        if self.running < self.concurrency and not self._waiters:
+            self.running += 1
+        else:
+            if len(self._waiters) >= self.max_queue:
+                self.rejected += 1
+                raise Overloaded(self.name, 429, self.retry_after(), "queue is full")
+            slot = asyncio.get_running_loop().create_future()
+            self._waiters.append(slot)
+            try:
+                await asyncio.wait_for(slot, self.timeout)
+            except BaseException as e:
+                if slot.done() and not slot.cancelled():
+                    # A slot was handed over just as we gave up
+                    self.release()
+                elif slot in self._waiters:
+                    self._waiters.remove(slot)
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timed_out += 1
+                    raise Overloaded(self.name, 503, self.retry_after(), "timed out waiting for a slot")
+                raise
+        self.admitted += 1
+        self._waits.append(time.monotonic() - arrived)
+        return time.monotonic()
+
+    def release(self, started=None):
+        if started is not None:
+            self.completed += 1
+            elapsed = time.monotonic() - started
+            self._service = elapsed if self._service is None else 0.8 * self._service + 0.2 * elapsed
+        # Hand the slot straight to the next waiter, if any
+        while self._waiters:
+            slot = self._waiters.popleft()
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self.running -= 1
+
+    def stats(self):
+        waits = sorted(self._waits)
+        return {
+            "pool": self.pool,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ms_avg": round(sum(waits) / len(waits) * 1000, 2) if waits else 0,
+            "wait_ms_p95": round(waits[int(0.95 * (len(waits) - 1))] * 1000, 2) if waits else 0,
+            "wait_ms_max": round(waits[-1] * 1000, 2) if waits else 0,
+            "service_ms_avg": round(self._service * 1000, 2) if self._service is not None else None,
+        }
+
+
+def _parse_limits(spec):
+    limits = {}
+    for entry in spec.split(","):
+        if not entry.strip():
+            continue
+        name, _, values = entry.partition("=")
+        pool, concurrency, queue, timeout = values.split(":")
+        limits[name.strip()] = (pool.strip(), int(concurrency), int(queue), float(timeout))
+    return limits
+
+
+_lanes = {
+    name: _Lane(name, *limits)
+    for name, limits in {**DEFAULT_LIMITS, **_parse_limits(LIMITS)}.items()
+}
+_pools = {}
+
+
+def _pool(kind):
+    if kind not in _pools:
+        if kind == "process":
+            # Not fork(): a forked child would inherit locks held by other threads
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            _pools[kind] = ProcessPoolExecutor(max_workers=PROCESS_WORKERS, mp_context=multiprocessing.get_context(method))
+        else:
+            workers = IO_WORKERS if kind == "io" else CPU_WORKERS
+            _pools[kind] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"api-{kind}")
+    return _pools[kind]
+
+
+def _lane(endpoint):
+    if endpoint not in _lanes:
+        raise KeyError(f"No executor limits configured for {endpoint}")
+    return _lanes[endpoint]
+
+
+def _release_when_done(lane, started):
+    def done(future):
+        if not future.cancelled():
+            # Mark the outcome retrieved, in case the caller is gone
+            future.exception()
+        lane.release(started)
+    return done
+
+
+async def run(endpoint, fn, *args, **kwargs):
+    """
+    Run `fn(*args, **kwargs)` on the endpoint's pool once admitted.
+    Raises Overloaded when the endpoint is saturated. The slot is held until
+    the work itself finishes: a cancelled caller stops waiting, but the pool
+    keeps running the call, so it still counts against the limits.
+    """
+    lane = _lane(endpoint)
+    started = await lane.acquire()
+    try:
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(_pool(lane.pool), functools.partial(fn, *args, **kwargs))
+    except BaseException:
+        lane.release(started)
+        raise
+    future.add_done_callback(_release_when_done(lane, started))
+    return await asyncio.shield(future)
+
+
+class _Slot:
+    def __init__(self, lane, started):
+        self._lane = lane
+        self._started = started
+        self._released = False
+        self._loop = asyncio.get_running_loop()
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            self._lane.release(self._started)
+
+    def release(self):
+        """Idempotent, and safe from any thread: lanes are only touched on their loop."""
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._release()
+        else:
+            self._loop.call_soon_threadsafe(self._release)
+
+
+_DONE = object()
+
+
+async def _drain(slot, pool, iterator):
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            item = await loop.run_in_executor(pool, next, iterator, _DONE)
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        slot.release()
+
+
+async def stream(endpoint, iterable):
+    """
+    Admit a streaming call and return (body, release): an async iterator
+    pulling `iterable` on the endpoint's pool, which holds the slot until it
+    is exhausted, and an idempotent release for when it never gets iterated.
+    """
+    lane = _lane(endpoint)
+    if lane.pool == "process":
+        raise ValueError("Streaming endpoints cannot use the process pool")
+    slot = _Slot(lane, await lane.acquire())
+    return _drain(slot, _pool(lane.pool), iter(iterable)), slot.release
+
+
+def stats():
+    """Per-endpoint admission state plus pool sizes."""
+    return {
+        "pools": {"io": IO_WORKERS, "cpu": CPU_WORKERS, "process": PROCESS_WORKERS},
+        "endpoints": {name: lane.stats() for name, lane in _lanes.items()},
+    }
@@ -1,25 +1,49 @@
-from scanner.technicals import calculate_technicals, is_valid_setup, describe_setup
+from scanner import data_loader
+from scanner.technicals import latest_signals, build_panel, group_frames, scan_panel
 
-def filter_stocks(stock_data_dict):
+def filter_stocks(stock_data_dict, use_panel=True):
     """
     Filter all stocks in the dictionary and return only valid setups.
+    With use_panel the dictionary is evaluated in batched passes, one per calendar.
     """
+    if use_panel:
+        setups = [
+            setup
+            for group in group_frames(stock_data_dict)
+            for setup in scan_panel(build_panel(group))
+        ]
+        order = {ticker: i for i, ticker in enumerate(stock_data_dict)}
+        setups.sort(key=lambda setup: order[setup["ticker"]])
+        return [
+            {key: setup[key] for key in ("ticker", "setup", "price", "rsi", "sma_20", "sma_50")}
+            for setup in setups
+        ]
+
     setups = []
 
     for ticker, df in stock_data_dict.items():
         try:
-            df = calculate_technicals(df)
-            if is_valid_setup(df):
-                setup_type = describe_setup(df)
+            signals = latest_signals(df)
+            if signals and signals[-1]["valid"]:
+                latest = signals[-1]
                 setups.append({
                     "ticker": ticker,
-                    "setup": setup_type,
-                    "price": df["Close"].iloc[-1],
-                    "rsi": df["RSI"].iloc[-1],
-                    "sma_20": df["SMA_20"].iloc[-1],
-                    "sma_50": df["SMA_50"].iloc[-1],
+                    "setup": latest["setup"],
+                    "price": latest["price"],
+                    "rsi": latest["rsi"],
+                    "sma_20": latest["sma_20"],
+                    "sma_50": latest["sma_50"],
                 })
         except Exception as e:
             print(f"Error processing {ticker}: {e}")
 
     return setups
+
+
+def filter_tickers(tickers, period="6mo"):
+    """
+    Bulk-load a list of tickers and filter them like filter_stocks.
+    Returns (setups, failed) where failed maps ticker -> reason.
+    """
+    frames, failed = data_loader.get_data_many(tickers, period=period)
+    return filter_stocks(frames), failed
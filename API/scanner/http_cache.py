@@ -0,0 +1,100 @@
+import os
+import gzip
+from scanner import result_cache
+
+# Conditional GET support for polled endpoints. An ETag is a hash of what a
+# response depends on (ticker data version, parameters, ...), so a client
+# that already has it gets 304 before anything is recomputed. Rendered bodies
+# and their gzip-compressed forms are kept per ETag in a small LRU, so hot
+# keys are compressed once rather than on every poll. A gzip body is a
+# different representation, so it is sent under its own tag ("...-gzip").
+
+RESPONSE_CACHE_MB = float(os.getenv("RESPONSE_CACHE_MB", "64"))
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+
+_bodies = result_cache.ResultCache("responses", max_bytes=RESPONSE_CACHE_MB * 1024 * 1024, directory="")
+
+
+def make_etag(*parts):
+    """Strong ETag for a response determined by `parts`."""
+    return f'"{result_cache.make_key(*parts)[:24]}"'
+
+
+def gzip_etag(etag):
+    """Tag of the gzip-encoded representation of the body tagged `etag`."""
+    return f'{etag[:-1]}-gzip"'
+
+
+def not_modified(if_none_match, etag, accept_encoding=None, body=None):
+    """
+    The ETag to send with a 304 when an If-None-Match header value holds the
+    tag of the representation this request would get (`etag` itself, or its
+    gzip variant when the body would be compressed for `accept_encoding`),
+    else None. `body` is the uncompressed body if at hand; otherwise a cached
+    rendering tells whether it would be compressed.
+    """
+    if not if_none_match or etag is None:
+        return None
+    # Weak comparison, as RFC 9110 asks for If-None-Match
+    tags = set()
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        tags.add(tag[2:] if tag.startswith("W/") else tag)
+
+    if not _accepts_gzip(accept_encoding):
+        sent = etag
+    else:
+        if body is None:
+            rendered = _bodies.get(etag)
+            body = rendered[0] if rendered is not None else None
+        if body is not None:
+            sent = gzip_etag(etag) if len(body) >= COMPRESS_MIN_BYTES else etag
+        elif gzip_etag(etag) in tags:
+            # Only bodies big enough to compress ever carry the gzip tag
+            sent = gzip_etag(etag)
+        else:
+            # Can't tell which representation this would be without the body
+            return None
+    return sent if "*" in tags or sent in tags else None
+
+
+def get(etag):
+    """Cached (body, media type, headers) rendered for `etag`, or None."""
+    return _bodies.get(etag)
+
+
+def put(etag, rendered):
+    _bodies.put(etag, rendered)
+
+
+def _accepts_gzip(accept_encoding):
+    for coding in (accept_encoding or "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def encode(etag, body, accept_encoding):
+    """
+    (body, headers) to send: gzip-compressed when the client accepts it and
+    the body is worth it, reusing the compressed copy cached for `etag`.
+    `etag` tags the uncompressed body; gzip bodies get gzip_etag(etag).
+    """
+    headers = {"ETag": etag, "Vary": "Accept-Encoding"}
+    if len(body) < COMPRESS_MIN_BYTES or not _accepts_gzip(accept_encoding):
+        return body, headers
+
+    compressed = _bodies.get(f"{etag}:gzip")
+    if compressed is None:
+        compressed = gzip.compress(body, COMPRESS_LEVEL, mtime=0)
+        _bodies.put(f"{etag}:gzip", compressed)
+    headers["Content-Encoding"] = "gzip"
+    headers["ETag"] = gzip_etag(etag)
+    return compressed, headers
+
+
+def stats():
+    return _bodies.stats()
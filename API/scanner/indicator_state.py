@@ -0,0 +1,248 @@
+import math
+from collections import deque
+import numpy as np
+import pandas as pd
+from scanner import rules
+
+# Streaming counterpart of calculate_technicals: keeps just enough running
+# state per ticker to produce the latest row's indicators and flags in O(1)
+# per completed bar, and round-trips through to_dict/from_dict so it can be
+# persisted between restarts.
+#
+# Bars with missing values are handled like the batch kernels: a NaN close or
+# volume takes its slot in the rolling windows but adds nothing to the sums,
+# and the averages stay NaN until the window holds only real values again; a
+# NaN high blanks the 20-bar high for 20 bars; RSI decays its weights over a
+# missing change the way pandas' ewm does.
+
+RSI_LENGTH = 14
+NAN = float("nan")
+
+
+def _add(value, total, missing):
+    if math.isnan(value):
+        return total, missing + 1
+    return total + value, missing
+
+
+def _drop(value, total, missing):
+    if math.isnan(value):
+        return total, missing - 1
+    return total - value, missing
+
+
+class IndicatorState:
+    def __init__(self):
+        self.bars = 0
+        self.valid_rows = 0
+        self.last_timestamp = None
+
+        self.closes = deque(maxlen=50)
+        self.sum20 = 0.0
+        self.sum50 = 0.0
+        # Missing closes/volumes currently inside each window
+        self.nan20 = 0
+        self.nan50 = 0
+        self.volumes = deque(maxlen=20)
+        self.volume_sum = 0.0
+        self.volume_nans = 0
+        # Monotonic deque of (bar number, high) for the 20-bar high, and the
+        # bar number of the last missing high
+        self.highs = deque()
+        self.last_nan_high = None
+
+        self.avg_gain = NAN
+        self.avg_loss = NAN
+        self.rsi_obs = 0
+        # Total weight behind the running averages, as in pandas' ewm with
+        # adjust=True (what pandas_ta's rma uses)
+        self.rsi_weight = 1.0
+
+        self.prev = {"close": NAN, "high": NAN, "low": NAN, "sma20": NAN, "20d_high": NAN}
+        self.latest = {}
+
+    @classmethod
+    def from_history(cls, df):
+        """Warm up from an OHLCV DataFrame, oldest bar first."""
+        state = cls()
+        for timestamp, row in zip(df.index, df[['Open', 'High', 'Low', 'Close', 'Volume']].itertuples(index=False)):
+            state.update(row._asdict(), timestamp=timestamp)
+        return state
+
+    def update(self, bar, timestamp=None):
+        """
+        Advance by one completed bar (mapping with Open/High/Low/Close/Volume)
+        and return the row calculate_technicals would produce for it. Bars at
+        or before the last seen timestamp are ignored, so replaying overlapping
+        history after a restart is safe.
+        """
+        if timestamp is not None:
+            if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+                return self.latest
+            self.last_timestamp = timestamp
+
+        open_, high, low = float(bar['Open']), float(bar['High']), float(bar['Low'])
+        close, volume = float(bar['Close']), float(bar['Volume'])
+        prev_close = self.closes[-1] if self.closes else NAN
+
+        # SMAs from running sums of the real closes among the last 20/50
+        if len(self.closes) >= 20:
+            self.sum20, self.nan20 = _drop(self.closes[-20], self.sum20, self.nan20)
+        if len(self.closes) == 50:
+            self.sum50, self.nan50 = _drop(self.closes[0], self.sum50, self.nan50)
+        self.closes.append(close)
+        self.sum20, self.nan20 = _add(close, self.sum20, self.nan20)
+        self.sum50, self.nan50 = _add(close, self.sum50, self.nan50)
+        sma20 = self.sum20 / 20 if len(self.closes) >= 20 and not self.nan20 else NAN
+        sma50 = self.sum50 / 50 if len(self.closes) >= 50 and not self.nan50 else NAN
+
+        # Wilder RSI, seeded with the first change like pandas_ta
+        change = close - prev_close
+        if self.rsi_obs:
+            self.rsi_weight *= 1.0 - 1.0 / RSI_LENGTH
+        if not math.isnan(change):
+            gain, loss = max(change, 0.0), max(-change, 0.0)
+            if self.rsi_obs == 0:
+                self.avg_gain, self.avg_loss = gain, loss
+            else:
+                weight = self.rsi_weight
+                if self.avg_gain != gain:
+                    self.avg_gain = (weight * self.avg_gain + gain) / (weight + 1.0)
+                if self.avg_loss != loss:
+                    self.avg_loss = (weight * self.avg_loss + loss) / (weight + 1.0)
+                self.rsi_weight += 1.0
+            self.rsi_obs += 1
+        rsi = NAN
+        if self.rsi_obs >= RSI_LENGTH and self.avg_gain + self.avg_loss != 0:
+            rsi = 100.0 * self.avg_gain / (self.avg_gain + self.avg_loss)
+
+        # 20-bar high
+        if math.isnan(high):
+            self.last_nan_high = self.bars
+        else:
+            while self.highs and self.highs[-1][1] <= high:
+                self.highs.pop()
+            self.highs.append((self.bars, high))
+        while self.highs and self.highs[0][0] <= self.bars - 20:
+            self.highs.popleft()
+        high20 = NAN
+        if self.bars >= 19 and (self.last_nan_high is None or self.last_nan_high <= self.bars - 20):
+            high20 = self.highs[0][1]
+
+        # 20-bar average volume
+        if len(self.volumes) == 20:
+            self.volume_sum, self.volume_nans = _drop(self.volumes[0], self.volume_sum, self.volume_nans)
+        self.volumes.append(volume)
+        self.volume_sum, self.volume_nans = _add(volume, self.volume_sum, self.volume_nans)
+        avg_volume = self.volume_sum / 20 if len(self.volumes) == 20 and not self.volume_nans else NAN
+
+        prev = self.prev
+        row = {
+            'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume,
+            'SMA_20': sma20,
+            'SMA_50': sma50,
+            'RSI': rsi,
+            '20d_high': high20,
+            'Avg_Volume_20': avg_volume,
+            'prev_close': prev['close'],
+            'prev_high': prev['high'],
+            'prev_low': prev['low'],
+            'prev_sma20': prev['sma20'],
+            'prev_20d_high': prev['20d_high'],
+        }
+        # NaN comparisons are False, matching the batch flags
+        row['Breakout'] = close > row['prev_20d_high']
+        row['Pullback_Bounce'] = (
+            close > sma50 and row['prev_low'] < row['prev_sma20'] and close > row['prev_close']
+        )
+        row['Volume_Spike'] = volume > avg_volume * 1.5
+        row['Big_Green'] = close > open_ and close > row['prev_high']
+        row['RSI_Strength'] = rsi > 55
+        row['Above_SMA20'] = close > sma20
+        row['Bullish_Momentum'] = (
+            row['Volume_Spike'] and row['Big_Green'] and row['RSI_Strength'] and row['Above_SMA20']
+        )
+        row['valid'] = not any(math.isnan(v) for v in row.values() if isinstance(v, float))
+
+        self.prev = {"close": close, "high": high, "low": low, "sma20": sma20, "20d_high": high20}
+        self.bars += 1
+        if row['valid']:
+            self.valid_rows += 1
+            self.latest = row
+        return row
+
+    def _rule_flags(self):
+        # The active setup rules evaluated on the latest row, which carries
+        # every column a rule expression can reference
+        compiled = rules.get_rules()
+        with np.errstate(invalid="ignore"):
+            return compiled, {rule.name: bool(rule.evaluate(self.latest)) for rule in compiled.rules}
+
+    def is_valid_setup(self):
+        """Same rule as technicals.is_valid_setup on the batch output."""
+        if self.valid_rows < 30:
+            return False
+        _, flags = self._rule_flags()
+        return any(flags.values())
+
+    def describe_setup(self):
+        if not self.latest:
+            return "No clear setup"
+        compiled, flags = self._rule_flags()
+        return compiled.label_for(flags)
+
+    def to_dict(self):
+        return {
+            'bars': self.bars,
+            'valid_rows': self.valid_rows,
+            'last_timestamp': None if self.last_timestamp is None else str(self.last_timestamp),
+            'closes': list(self.closes),
+            'sum20': self.sum20,
+            'sum50': self.sum50,
+            'volumes': list(self.volumes),
+            'volume_sum': self.volume_sum,
+            'highs': [list(item) for item in self.highs],
+            'last_nan_high': self.last_nan_high,
+            'avg_gain': self.avg_gain,
+            'avg_loss': self.avg_loss,
+            'rsi_obs': self.rsi_obs,
+            'rsi_total_weight': self.rsi_weight,
+            'prev': dict(self.prev),
+            'latest': dict(self.latest),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls()
+        state.bars = data['bars']
+        state.valid_rows = data['valid_rows']
+        if data['last_timestamp'] is not None:
+            state.last_timestamp = pd.Timestamp(data['last_timestamp'])
+        state.closes = deque(data['closes'], maxlen=50)
+        state.volumes = deque(data['volumes'], maxlen=20)
+        # Window sums are rebuilt from the values rather than trusted, so a
+        # state saved with a NaN in its sums recovers once the bar leaves
+        for close in list(state.closes)[-20:]:
+            state.sum20, state.nan20 = _add(close, state.sum20, state.nan20)
+        for close in state.closes:
+            state.sum50, state.nan50 = _add(close, state.sum50, state.nan50)
+        for volume in state.volumes:
+            state.volume_sum, state.volume_nans = _add(volume, state.volume_sum, state.volume_nans)
+        state.highs = deque((int(i), h) for i, h in data['highs'] if not math.isnan(h))
+        state.last_nan_high = data.get('last_nan_high')
+        state.avg_gain = data['avg_gain']
+        state.avg_loss = data['avg_loss']
+        state.rsi_obs = data['rsi_obs']
+        if 'rsi_total_weight' in data:
+            state.rsi_weight = data['rsi_total_weight']
+        else:
+            # Saved before RSI used pandas' adjust=True weights: assume an
+            # unbroken run of changes
+            decay = 1.0 - 1.0 / RSI_LENGTH
+            state.rsi_weight = (1.0 - decay ** max(state.rsi_obs, 1)) * RSI_LENGTH
+        if state.rsi_obs and (math.isnan(state.avg_gain) or math.isnan(state.avg_loss)):
+            # Averages poisoned by a NaN bar: start RSI over
+            state.avg_gain, state.avg_loss, state.rsi_obs, state.rsi_weight = NAN, NAN, 0, 1.0
+        state.prev = dict(data['prev'])
+        state.latest = dict(data['latest'])
+        return state
@@ -0,0 +1,163 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# NumPy indicator kernels. Every function works along axis 0, so the same code
+# handles one ticker (1-D arrays) or a dates x tickers panel (2-D arrays).
+# NaN semantics follow pandas: a window containing NaN yields NaN.
+
+# Part of the keys of persisted results derived from these indicators; bump
+# it whenever a formula changes so results built on old values aren't reused
+FORMULA_VERSION = 2
+
+
+def shift(x, periods=1):
+    out = np.full_like(x, np.nan, dtype=float)
+    out[periods:] = x[:-periods]
+    return out
+
+
+def rolling_mean(x, window):
+    """Cumulative-sum moving average; NaN until `window` valid values are in view."""
+    x = np.asarray(x, dtype=float)
+    valid = ~np.isnan(x)
+    pad = np.zeros((1,) + x.shape[1:])
+    sums = np.concatenate([pad, np.cumsum(np.where(valid, x, 0.0), axis=0)])
+    counts = np.concatenate([pad, np.cumsum(valid, axis=0)])
+
+    out = np.full(x.shape, np.nan)
+    if len(x) >= window:
+        window_sum = sums[window:] - sums[:-window]
+        full = (counts[window:] - counts[:-window]) == window
+        out[window - 1:] = np.where(full, window_sum / window, np.nan)
+    return out
+
+
+def rolling_max(x, window):
+    x = np.asarray(x, dtype=float)
+    out = np.full(x.shape, np.nan)
+    if len(x) >= window:
+        out[window - 1:] = sliding_window_view(x, window, axis=0).max(axis=-1)
+    return out
+
+
+def _ewm_1d(values, alpha, min_periods):
+    # Plain float loop: far cheaper than per-step NumPy calls for one series.
+    # Same recursion as pandas' ewma with adjust=True and ignore_na=False.
+    out = [np.nan] * len(values)
+    decay = 1.0 - alpha
+    avg = np.nan
+    old_wt = 1.0
+    nobs = 0
+    for t, x in enumerate(values):
+        obs = x == x
+        if avg == avg:
+            old_wt *= decay
+            if obs:
+                if avg != x:
+                    avg = (old_wt * avg + x) / (old_wt + 1.0)
+                old_wt += 1.0
+        elif obs:
+            avg = x
+        if obs:
+            nobs += 1
+        if nobs >= min_periods:
+            out[t] = avg
+    return np.array(out)
+
+
+def ewm_mean(x, alpha, min_periods=0):
+    """
+    Equivalent of pandas' ewm(alpha=alpha, min_periods=...).mean() with its
+    defaults (adjust=True, ignore_na=False): each value weighs (1 - alpha) to
+    the power of its age in rows, missing rows included, and the average is
+    normalised by the total weight seen so far.
+    """
+    x = np.asarray(x, dtype=float)
+    if x.ndim == 1:
+        return _ewm_1d(x.tolist(), alpha, min_periods)
+
+    out = np.full(x.shape, np.nan)
+    if not len(x):
+        return out
+    # Panel: the weighted sum and the total weight decay together and their
+    # ratio is the average; a missing value adds to neither
+    observed = ~np.isnan(x)
+    values = np.where(observed, x, 0.0)
+    sums = np.empty(x.shape)
+    weights = np.empty(x.shape)
+    sums[0], weights[0] = values[0], observed[0]
+    decay = 1.0 - alpha
+    for t in range(1, len(x)):
+        np.multiply(sums[t - 1], decay, out=sums[t])
+        sums[t] += values[t]
+        np.multiply(weights[t - 1], decay, out=weights[t])
+        weights[t] += observed[t]
+
+    started = np.cumsum(observed, axis=0) >= max(min_periods, 1)
+    np.divide(sums, weights, out=out, where=started)
+    return out
+
+
+def wilder_rsi(close, length=14):
+    """
+    Wilder RSI as pandas_ta.rsi computes it without TA-Lib: gains and losses
+    smoothed by its rma, an ewm(alpha=1/length, min_periods=length) mean
+    (adjust=True), starting from the first change.
+    """
+    delta = np.asarray(close, dtype=float) - shift(close)
+    gains = np.where(delta < 0, 0.0, delta)
+    losses = np.where(delta > 0, 0.0, -delta)
+    avg_gain = ewm_mean(gains, 1.0 / length, min_periods=length)
+    avg_loss = ewm_mean(losses, 1.0 / length, min_periods=length)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 100.0 * avg_gain / (avg_gain + avg_loss)
+
+
+# Indicator columns in the order calculate_technicals produces them
+INDICATOR_COLUMNS = [
+    "SMA_20", "SMA_50", "RSI", "20d_high", "Avg_Volume_20",
+    "prev_close", "prev_high", "prev_low", "prev_sma20", "prev_20d_high",
+]
+FLAG_COLUMNS = [
+    "Breakout", "Pullback_Bounce", "Volume_Spike", "Big_Green",
+    "RSI_Strength", "Above_SMA20", "Bullish_Momentum",
+]
+
+
+def compute_indicators(open_, high, low, close, volume):
+    """
+    All indicator series used by the scanner. Returns (values, valid) where
+    values is a float array shaped (len(INDICATOR_COLUMNS),) + close.shape
+    and valid marks the rows where every indicator is defined.
+    """
+    close = np.asarray(close, dtype=float)
+    values = np.empty((len(INDICATOR_COLUMNS),) + close.shape)
+    sma20, sma50, rsi, high20, avg_vol, prev_close, prev_high, prev_low, prev_sma20, prev_high20 = values
+
+    sma20[:] = rolling_mean(close, 20)
+    sma50[:] = rolling_mean(close, 50)
+    rsi[:] = wilder_rsi(close, 14)
+    high20[:] = rolling_max(high, 20)
+    avg_vol[:] = rolling_mean(volume, 20)
+    prev_close[:] = shift(close)
+    prev_high[:] = shift(np.asarray(high, dtype=float))
+    prev_low[:] = shift(np.asarray(low, dtype=float))
+    prev_sma20[:] = shift(sma20)
+    prev_high20[:] = shift(high20)
+
+    valid = ~np.isnan(values).any(axis=0)
+    return values, valid
+
+
+def compute_flags(open_, high, low, close, volume, values):
+    """Signal flags from compute_indicators output; NaN comparisons are False."""
+    sma20, sma50, rsi, high20, avg_vol, prev_close, prev_high, prev_low, prev_sma20, prev_high20 = values
+    with np.errstate(invalid="ignore"):
+        breakout = close > prev_high20
+        pullback = (close > sma50) & (prev_low < prev_sma20) & (close > prev_close)
+        volume_spike = volume > avg_vol * 1.5
+        big_green = (close > open_) & (close > prev_high)
+        rsi_strength = rsi > 55
+        above_sma20 = close > sma20
+    momentum = volume_spike & big_green & rsi_strength & above_sma20
+    return np.stack([breakout, pullback, volume_spike, big_green, rsi_strength, above_sma20, momentum])
@@ -0,0 +1,225 @@
+import os
+import numpy as np
+import pandas as pd
+from scanner import data_loader, rules, technicals
+from scanner.backtester import HOLD_BARS
+
+# Portfolio-level backtest. Unlike run_backtest, which gives every ticker its
+# own balance, all tickers draw on one pool of capital: setup signals become
+# a date-ordered stream of entry events, positions are opened while cash and
+# slots allow, held for `hold` bars and marked to market daily.
+#
+# Prices are loaded a batch of tickers at a time and reduced to a float32
+# close matrix plus compact candidate-trade arrays, so memory grows with
+# dates x tickers rather than with DataFrames per trade.
+
+BATCH_SIZE = int(os.getenv("PORTFOLIO_BATCH_SIZE", "200"))
+
+
+def _candidates(panel, hold):
+    """
+    Entry signals for one panel of tickers, as arrays of (entry row, exit row,
+    column, score). A signal fires where setup_signals would, and exits `hold`
+    valid bars later like backtest_strategy.
+    """
+    compiled = rules.get_rules()
+    _, flags, valid = compiled.evaluate(panel)
+    eligible = valid & (np.cumsum(valid, axis=0) >= 30)
+
+    # Score of the first rule that fires, in priority order
+    score = np.full(valid.shape, np.nan)
+    for rule in reversed(compiled.rules):
+        score = np.where(flags[rule.name], rule.score, score)
+    fired = eligible & ~np.isnan(score)
+
+    entries, exits, columns, scores = [], [], [], []
+    for j in range(valid.shape[1]):
+        rows = np.flatnonzero(valid[:, j])
+        k = np.flatnonzero(fired[rows, j])
+        k = k[k + hold < len(rows)]
+        entries.append(rows[k])
+        exits.append(rows[k + hold])
+        columns.append(np.full(len(k), j))
+        scores.append(score[rows[k], j])
+    if not entries:
+        return np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0, dtype=int), np.zeros(0)
+    return tuple(np.concatenate(a) for a in (entries, exits, columns, scores))
+
+
+def _load(tickers, period, hold, batch_size):
+    """
+    Close prices on the union of dates (float32, forward-filled) plus every
+    candidate trade, built batch by batch.
+    """
+    batches = []
+    failed = []
+    for start in range(0, len(tickers), batch_size):
+        frames, batch_failed = data_loader.get_data_many(tickers[start:start + batch_size], period=period, interval="1d")
+        failed.extend(batch_failed)
+        # Signals come from same-calendar panels; the union of dates is only
+        # built below for the close matrix
+        for group in technicals.group_frames(frames):
+            panel = technicals.build_panel(group)
+            if not panel['tickers']:
+                continue
+            entries, exits, columns, scores = _candidates(panel, hold)
+            dates = panel['dates']
+            batches.append((
+                panel['tickers'], dates, panel['Close'].astype(np.float32),
+                dates[entries].values, dates[exits].values, columns, scores,
+            ))
+            del panel
+        del frames
+
+    dates = pd.DatetimeIndex(sorted(set().union(*[b[1] for b in batches]))) if batches else pd.DatetimeIndex([])
+    tickers_out = []
+    close = np.full((len(dates), sum(len(b[0]) for b in batches)), np.nan, dtype=np.float32)
+    cand = {"entry": [], "exit": [], "ticker": [], "score": []}
+    for names, batch_dates, batch_close, entry_dates, exit_dates, columns, scores in batches:
+        offset = len(tickers_out)
+        tickers_out.extend(names)
+        close[dates.get_indexer(batch_dates), offset:offset + len(names)] = batch_close
+        cand["entry"].append(dates.get_indexer(entry_dates))
+        cand["exit"].append(dates.get_indexer(exit_dates))
+        cand["ticker"].append(columns + offset)
+        cand["score"].append(scores)
+    batches.clear()
+
+    close = pd.DataFrame(close).ffill().to_numpy(dtype=np.float32)
+    if cand["entry"]:
+        cand = {key: np.concatenate(arrays) for key, arrays in cand.items()}
+    else:
+        cand = {"entry": np.zeros(0, dtype=int), "exit": np.zeros(0, dtype=int),
+                "ticker": np.zeros(0, dtype=int), "score": np.zeros(0)}
+
+    # Entry order: by date, best setup score first, then ticker order
+    rank = np.argsort(np.argsort(np.asarray(tickers_out, dtype=object)))
+    order = np.lexsort((rank[cand["ticker"]], -cand["score"], cand["entry"]))
+    cand = {key: arr[order] for key, arr in cand.items()}
+    return dates, tickers_out, close, cand, sorted(failed)
+
+
+def simulate_portfolio(tickers, period="1y", hold=HOLD_BARS, initial_capital=100000,
+                       position_size=0.1, max_positions=10, max_position_value=None,
+                       batch_size=None):
+    """
+    Event-driven backtest of the setup signals across `tickers` sharing one
+    account. Each entry buys `position_size` of current equity (capped by
+    `max_position_value` and by available cash), at most `max_positions`
+    are open at once and a ticker is never held twice. When more signals fire
+    than there is room for, higher-scoring setups go first.
+
+    Returns a dict with the daily 'equity' curve (Series), 'trades'
+    (DataFrame), 'stats' and the tickers that failed to load.
+    """
+    if max_positions < 1 or not 0 < position_size <= 1:
+        raise ValueError("max_positions must be >= 1 and position_size in (0, 1]")
+    if hold < 1:
+        raise ValueError("hold must be at least one bar")
+
+    tickers = sorted({ticker.strip().upper() for ticker in tickers if ticker.strip()})
+    dates, names, close, cand, failed = _load(tickers, period, hold, batch_size or BATCH_SIZE)
+
+    # Open positions live in fixed slots
+    slot_ticker = np.full(max_positions, -1)
+    slot_shares = np.zeros(max_positions)
+    slot_cost = np.zeros(max_positions)
+    slot_entry = np.zeros(max_positions, dtype=int)
+    slot_exit = np.full(max_positions, -1)
+    held = np.zeros(len(names), dtype=bool)
+
+    # Closed trades, at most one per candidate signal
+    n = len(cand["entry"])
+    log_ticker = np.empty(n, dtype=int)
+    log_entry = np.empty(n, dtype=int)
+    log_exit = np.empty(n, dtype=int)
+    log_shares = np.empty(n)
+    log_cost = np.empty(n)
+    log_proceeds = np.empty(n)
+    closed = 0
+    skipped = 0
+
+    cash = float(initial_capital)
+    equity = np.empty(len(dates))
+    bounds = np.searchsorted(cand["entry"], np.arange(len(dates) + 1))
+
+    for d in range(len(dates)):
+        prices = close[d]
+
+        # Exits first, so their cash is available to today's entries
+        for s in np.flatnonzero(slot_exit == d):
+            proceeds = slot_shares[s] * float(prices[slot_ticker[s]])
+            cash += proceeds
+            log_ticker[closed], log_entry[closed], log_exit[closed] = slot_ticker[s], slot_entry[s], d
+            log_shares[closed], log_cost[closed], log_proceeds[closed] = slot_shares[s], slot_cost[s], proceeds
+            closed += 1
+            held[slot_ticker[s]] = False
+            slot_ticker[s], slot_exit[s] = -1, -1
+
+        open_slots = slot_ticker >= 0
+        marked = cash + float((slot_shares[open_slots] * prices[slot_ticker[open_slots]]).sum())
+
+        free = list(np.flatnonzero(slot_ticker < 0))
+        for c in range(bounds[d], bounds[d + 1]):
+            if not free:
+                skipped += bounds[d + 1] - c
+                break
+            t = cand["ticker"][c]
+            if held[t]:
+                skipped += 1
+                continue
+            budget = min(marked * position_size, cash)
+            if max_position_value is not None:
+                budget = min(budget, max_position_value)
+            price = float(prices[t])
+            if budget <= 0 or not price > 0:
+                skipped += 1
+                continue
+            s = free.pop(0)
+            slot_ticker[s], slot_shares[s], slot_cost[s] = t, budget / price, budget
+            slot_entry[s], slot_exit[s] = d, cand["exit"][c]
+            held[t] = True
+            cash -= budget
+
+        open_slots = slot_ticker >= 0
+        equity[d] = cash + float((slot_shares[open_slots] * prices[slot_ticker[open_slots]]).sum())
+
+    equity = pd.Series(equity, index=dates, name="equity")
+    pnl = log_proceeds[:closed] - log_cost[:closed]
+    trades = pd.DataFrame({
+        'ticker': np.asarray(names, dtype=object)[log_ticker[:closed]] if closed else np.array([], dtype=object),
+        'entry_date': dates[log_entry[:closed]],
+        'exit_date': dates[log_exit[:closed]],
+        'entry_price': log_cost[:closed] / log_shares[:closed],
+        'exit_price': log_proceeds[:closed] / log_shares[:closed],
+        'shares': log_shares[:closed],
+        'pnl': pnl,
+    })
+    return {
+        'equity': equity,
+        'trades': trades,
+        'stats': _portfolio_stats(equity, pnl, initial_capital, skipped),
+        'failed': failed,
+    }
+
+
+def _portfolio_stats(equity, pnl, initial_capital, skipped):
+    if equity.empty:
+        final = float(initial_capital)
+        max_dd = max_dd_pct = 0.0
+    else:
+        final = float(equity.iloc[-1])
+        peak = equity.cummax()
+        max_dd = float((peak - equity).max())
+        max_dd_pct = float(((peak - equity) / peak).max() * 100)
+    return {
+        'final_equity': round(final, 2),
+        'total_return': round(final - initial_capital, 2),
+        'total_return_percent': round((final / initial_capital - 1) * 100, 2),
+        'max_drawdown': round(max_dd, 2),
+        'max_drawdown_percent': round(max_dd_pct, 2),
+        'total_trades': len(pnl),
+        'win_rate': round(float((pnl > 0).mean()) * 100, 1) if len(pnl) else 0,
+        'avg_gain': round(float(pnl.mean()), 2) if len(pnl) else 0,
+        'skipped_signals': int(skipped),
+    }
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+from scanner import providers
+
+# On-disk OHLCV store: one Parquet file per (ticker, interval) plus a small
+# JSON sidecar holding the data version and the last time we asked upstream
+# for new bars. Each market data provider gets its own subdirectory.
+STORE_DIR = os.getenv(
+    "PRICE_STORE_DIR",
+    os.path.join(os.path.expanduser("~"), ".stock_scanner", "prices"),
+)
+REFRESH_SECONDS = int(os.getenv("PRICE_STORE_REFRESH_SECONDS", "900"))
+# Number of (ticker, interval) histories kept decoded in memory
+MEMORY_ENTRIES = int(os.getenv("PRICE_STORE_MEMORY_ENTRIES", "2000"))
+
+_lock = threading.Lock()
+_meta = {}
+# Guards _meta: a sidecar read from disk must not overwrite a newer write.
+# Taken inside _lock, never the other way round.
+_meta_lock = threading.Lock()
+_frames = OrderedDict()
+_frames_lock = threading.Lock()
+
+
+def _store_dir():
+    return os.path.join(STORE_DIR, providers.get_provider().name)
+
+
+def store_path(filename):
+    """Path for an auxiliary file kept next to the provider's bars."""
+    os.makedirs(_store_dir(), exist_ok=True)
+    return os.path.join(_store_dir(), filename)
+
+
+def _key(ticker, interval):
+    safe = ticker.upper().replace("/", "_").replace("\\", "_")
+    return f"{safe}_{interval}"
+
+
+def _paths(ticker, interval):
+    key = _key(ticker, interval)
+    return (
+        os.path.join(_store_dir(), f"{key}.parquet"),
+        os.path.join(_store_dir(), f"{key}.json"),
+    )
+
+
+def _version(df):
+    """Content-derived version: changes whenever rows are added or the last bars move."""
+    if df is None or df.empty:
+        return ""
+    tail = pd.util.hash_pandas_object(df.tail(5), index=True).values.tobytes()
+    digest = hashlib.sha1(tail).hexdigest()[:12]
+    return f"{len(df)}-{digest}"
+
+
+def _read_meta(ticker, interval):
+    key = (_store_dir(), _key(ticker, interval))
+    with _meta_lock:
+        meta = _meta.get(key)
+        if meta is not None:
+            return meta
+
+        _, meta_path = _paths(ticker, interval)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = {}
+        _meta[key] = meta
+        return meta
+
+
+def _write_meta(ticker, interval, meta):
+    _, meta_path = _paths(ticker, interval)
+    tmp = f"{meta_path}.tmp"
+    with _meta_lock:
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+        _meta[(_store_dir(), _key(ticker, interval))] = meta
+
+
+def _remember(ticker, interval, version, df):
+    key = (_store_dir(), _key(ticker, interval))
+    with _frames_lock:
+        _frames[key] = (version, df)
+        _frames.move_to_end(key)
+        while len(_frames) > MEMORY_ENTRIES:
+            _frames.popitem(last=False)
+
+
+def read(ticker, interval="1d"):
+    """
+    Return the stored bars for a ticker, or an empty DataFrame. Recently used
+    histories are served from memory; the frame is shared, so don't mutate it.
+    """
+    version = get_version(ticker, interval)
+    key = (_store_dir(), _key(ticker, interval))
+    with _frames_lock:
+        cached = _frames.get(key)
+        if cached is not None and cached[0] == version:
+            _frames.move_to_end(key)
+            return cached[1]
+
+    data_path, _ = _paths(ticker, interval)
+    if not os.path.exists(data_path):
+        return pd.DataFrame()
+    try:
+        df = pd.read_parquet(data_path)
+    except Exception as e:
+        print(f"⚠️ Corrupt price store entry for {ticker} ({interval}): {e}")
+        return pd.DataFrame()
+    _remember(ticker, interval, version, df)
+    return df
+
+
+def write(ticker, interval, df, period=None):
+    """Replace the stored bars for a ticker and bump its data version."""
+    os.makedirs(_store_dir(), exist_ok=True)
+    data_path, _ = _paths(ticker, interval)
+    with _lock:
+        tmp = f"{data_path}.tmp"
+        df.to_parquet(tmp)
+        os.replace(tmp, data_path)
+        meta = dict(_read_meta(ticker, interval))
+        meta["version"] = _version(df)
+        meta["checked_at"] = time.time()
+        if period is not None:
+            meta["period"] = period
+        _write_meta(ticker, interval, meta)
+    _remember(ticker, interval, meta["version"], df)
+    return meta["version"]
+
+
+def append(ticker, interval, stored, new_bars):
+    """
+    Merge freshly downloaded bars onto the stored history. New bars win on
+    overlap, so a partial bar from earlier in the session gets replaced.
+    """
+    if new_bars is None or new_bars.empty:
+        mark_checked(ticker, interval)
+        return stored
+
+    if stored is None or stored.empty:
+        merged = new_bars
+    else:
+        merged = pd.concat([stored[stored.index < new_bars.index[0]], new_bars])
+    write(ticker, interval, merged)
+    return merged
+
+
+def mark_checked(ticker, interval):
+    """Record that upstream had nothing newer than what we already store."""
+    os.makedirs(_store_dir(), exist_ok=True)
+    with _lock:
+        meta = dict(_read_meta(ticker, interval))
+        meta["checked_at"] = time.time()
+        _write_meta(ticker, interval, meta)
+
+
+def stored_period(ticker, interval="1d"):
+    return _read_meta(ticker, interval).get("period")
+
+
+def is_fresh(ticker, interval="1d"):
+    checked_at = _read_meta(ticker, interval).get("checked_at", 0)
+    return time.time() - checked_at < REFRESH_SECONDS
+
+
+def get_version(ticker, interval="1d"):
+    """Data version of the stored bars, or "" when nothing is stored yet."""
+    return _read_meta(ticker, interval).get("version", "")
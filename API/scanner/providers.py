@@ -0,0 +1,224 @@
+import os
+import re
+import time
+import json
+import threading
+import numpy as np
+import pandas as pd
+import requests
+import yfinance as yf
+
+# Market data providers. Everything in the scanner that needs bars or the
+# screener universe goes through get_provider(), so the data source can be
+# swapped for a vendor feed or an offline replay without touching callers.
+
+
+class MarketDataProvider:
+    name = "base"
+
+    def download(self, tickers, interval="1d", period=None, start=None):
+        """Return a dict mapping ticker -> OHLCV DataFrame (missing tickers omitted)."""
+        raise NotImplementedError
+
+    def get_screener_rows(self, exchange):
+        """Return screener rows for an exchange as dicts with 'symbol' and 'lastsale'."""
+        raise NotImplementedError
+
+    def now(self):
+        """Reference 'current' time used to turn periods into start dates."""
+        return pd.Timestamp.now()
+
+
+class YFinanceProvider(MarketDataProvider):
+    name = "yfinance"
+
+    def download(self, tickers, interval="1d", period=None, start=None):
+        tickers = list(tickers)
+        df = yf.download(
+            tickers, period=period, start=start, interval=interval,
+            group_by="ticker", threads=False, progress=False,
+        )
+        frames = {}
+        if df.empty:
+            return frames
+
+        if not isinstance(df.columns, pd.MultiIndex):
+            # Single ticker without a ticker level
+            frames[tickers[0]] = df.dropna(how="all")
+            return frames
+
+        for ticker in df.columns.get_level_values(0).unique():
+            sub = df[ticker].dropna(how="all")
+            sub.columns.name = None
+            if not sub.empty:
+                frames[ticker] = sub
+        return frames
+
+    def get_screener_rows(self, exchange):
+        url = f"https://api.nasdaq.com/api/screener/stocks?tableonly=true&limit=5000&exchange={exchange}"
+        headers = {"User-Agent": "Mozilla/5.0"}
+        r = requests.get(url, headers=headers)
+        r.raise_for_status()
+        data = r.json()
+        return data["data"]["table"]["rows"]
+
+
+class ReplayProvider(MarketDataProvider):
+    """
+    Serves recorded or synthetic bars from disk: one <TICKER>.parquet or
+    <TICKER>.csv per ticker (daily data; other intervals live under a
+    subdirectory named after the interval). An optional screener.json holds
+    rows per exchange; without it every file is listed under "nasdaq".
+
+    `latency` seconds are slept per request to mimic a remote feed, and
+    periods are measured back from `as_of` (default: the last recorded bar)
+    so results do not drift with the wall clock.
+    """
+    name = "replay"
+
+    def __init__(self, root, latency=0.0, as_of=None):
+        self.root = root
+        self.latency = latency
+        self._as_of = pd.Timestamp(as_of) if as_of else None
+        self._frames = {}
+        self._lock = threading.Lock()
+
+    def _dir(self, interval):
+        return self.root if interval == "1d" else os.path.join(self.root, interval)
+
+    def _read(self, ticker, interval):
+        key = (ticker, interval)
+        with self._lock:
+            if key in self._frames:
+                return self._frames[key]
+
+        base = os.path.join(self._dir(interval), ticker)
+        if os.path.exists(f"{base}.parquet"):
+            df = pd.read_parquet(f"{base}.parquet")
+        elif os.path.exists(f"{base}.csv"):
+            df = pd.read_csv(f"{base}.csv", index_col=0, parse_dates=True)
+        else:
+            df = pd.DataFrame()
+
+        with self._lock:
+            self._frames[key] = df
+        return df
+
+    def _tickers(self, interval="1d"):
+        directory = self._dir(interval)
+        if not os.path.isdir(directory):
+            return []
+        names = {
+            os.path.splitext(f)[0] for f in os.listdir(directory)
+            if f.endswith((".parquet", ".csv"))
+        }
+        return sorted(names)
+
+    def download(self, tickers, interval="1d", period=None, start=None):
+        if self.latency:
+            time.sleep(self.latency)
+
+        frames = {}
+        for ticker in tickers:
+            df = self._read(ticker, interval)
+            if df.empty:
+                continue
+            if start is not None:
+                df = df[df.index >= pd.Timestamp(start)]
+            elif period_start(self.now(), period) is not None:
+                df = df[df.index >= period_start(self.now(), period)]
+            if not df.empty:
+                frames[ticker] = df
+        return frames
+
+    def get_screener_rows(self, exchange):
+        if self.latency:
+            time.sleep(self.latency)
+
+        path = os.path.join(self.root, "screener.json")
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f).get(exchange, [])
+
+        if exchange != "nasdaq":
+            return []
+        rows = []
+        for ticker in self._tickers():
+            df = self._read(ticker, "1d")
+            if not df.empty:
+                rows.append({"symbol": ticker, "lastsale": f"${df['Close'].iloc[-1]:.2f}"})
+        return rows
+
+    def now(self):
+        if self._as_of is None:
+            last = [self._read(t, "1d").index.max() for t in self._tickers()]
+            last = [ts for ts in last if not pd.isna(ts)]
+            self._as_of = max(last) if last else pd.Timestamp.now()
+        return self._as_of
+
+
+def period_start(now, period):
+    """First timestamp covered by a yfinance period string, or None for 'max'."""
+    now = now.normalize()
+    if period == "ytd":
+        return now.replace(month=1, day=1)
+    match = re.fullmatch(r"(\d+)(d|wk|mo|y)", period or "")
+    if not match:
+        return None
+    unit = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}[match.group(2)]
+    return now - pd.DateOffset(**{unit: int(match.group(1))})
+
+
+def write_replay_data(frames, root, interval="1d"):
+    """Record frames (ticker -> DataFrame) to disk in the ReplayProvider layout."""
+    directory = root if interval == "1d" else os.path.join(root, interval)
+    os.makedirs(directory, exist_ok=True)
+    for ticker, df in frames.items():
+        df.to_parquet(os.path.join(directory, f"{ticker}.parquet"))
+
+
+def make_synthetic_frames(tickers, bars=500, seed=0, end=None):
+    """Deterministic random-walk OHLCV bars for load tests and benchmarks."""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=end or "2024-12-31", periods=bars, name="Date")
+    frames = {}
+    for ticker in tickers:
+        start_price = rng.uniform(5, 300)
+        returns = rng.normal(0.0005, 0.02, bars)
+        close = start_price * np.exp(np.cumsum(returns))
+        open_ = close * (1 + rng.normal(0, 0.005, bars))
+        high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, bars))
+        low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, bars))
+        volume = rng.integers(100_000, 5_000_000, bars).astype(float)
+        frames[ticker] = pd.DataFrame(
+            {"Open": open_, "High": high, "Low": low, "Close": close, "Volume": volume},
+            index=index,
+        )
+    return frames
+
+
+_provider = None
+
+
+def _default_provider():
+    kind = os.getenv("MARKET_DATA_PROVIDER", "yfinance").lower()
+    if kind == "replay":
+        return ReplayProvider(
+            os.getenv("REPLAY_DATA_DIR", "replay_data"),
+            latency=float(os.getenv("REPLAY_LATENCY_MS", "0")) / 1000,
+            as_of=os.getenv("REPLAY_AS_OF"),
+        )
+    return YFinanceProvider()
+
+
+def get_provider():
+    global _provider
+    if _provider is None:
+        _provider = _default_provider()
+    return _provider
+
+
+def set_provider(provider):
+    """Swap the active provider (e.g. a ReplayProvider in benchmarks)."""
+    global _provider
+    _provider = provider
@@ -0,0 +1,161 @@
+import io
+import os
+import json
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+# Content-addressed cache for backtest results. Keys are hashes of everything
+# a result depends on (tickers, parameters, active rules and the data versions
+# of the bars used), so entries never need invalidating: new data simply
+# produces a new key. Entries live in an LRU capped by approximate size, and
+# optionally in a directory so they survive restarts.
+#
+# On disk an entry is JSON with DataFrames embedded as Parquet, never a
+# pickle: loading a file can only produce data, whoever wrote it. Only plain
+# values (None, bool, numbers, strings, lists, tuples, dicts with string
+# keys, DataFrames) can be persisted; anything else stays in memory only.
+
+MEMORY_MB = float(os.getenv("BACKTEST_CACHE_MB", "256"))
+# Empty disables on-disk persistence
+CACHE_DIR = os.getenv("BACKTEST_CACHE_DIR", "")
+
+
+def make_key(*parts):
+    """Stable hash of the repr of `parts`."""
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def sizeof(value):
+    """Rough in-memory size of a cached value, in bytes."""
+    if isinstance(value, (bytes, bytearray)):
+        return 64 + len(value)
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if isinstance(value, np.ndarray):
+        return 64 + value.nbytes
+    if isinstance(value, (tuple, list)):
+        return 64 + sum(sizeof(v) for v in value)
+    if isinstance(value, dict):
+        return 64 + sum(sizeof(v) for v in value.values())
+    return 64
+
+
+def _encode(value):
+    if isinstance(value, pd.DataFrame):
+        buffer = io.BytesIO()
+        value.to_parquet(buffer)
+        return {"__frame__": base64.b64encode(buffer.getvalue()).decode("ascii")}
+    if isinstance(value, tuple):
+        return {"__tuple__": [_encode(v) for v in value]}
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+    if isinstance(value, dict):
+        if not all(isinstance(k, str) for k in value):
+            raise TypeError("only string keys can be persisted")
+        return {k: _encode(v) for k, v in value.items()}
+    if isinstance(value, np.generic):
+        return value.item()
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    raise TypeError(f"{type(value).__name__} can't be persisted")
+
+
+def _decode(obj):
+    if "__frame__" in obj:
+        return pd.read_parquet(io.BytesIO(base64.b64decode(obj["__frame__"])))
+    if "__tuple__" in obj:
+        return tuple(obj["__tuple__"])
+    return obj
+
+
+def dumps(value):
+    """Serialize a cacheable value (see module notes) to bytes."""
+    return json.dumps(_encode(value)).encode("utf-8")
+
+
+def loads(data):
+    return json.loads(data, object_hook=_decode)
+
+
+class ResultCache:
+    def __init__(self, name, max_bytes=None, directory=None):
+        self.max_bytes = MEMORY_MB * 1024 * 1024 if max_bytes is None else max_bytes
+        directory = CACHE_DIR if directory is None else directory
+        self.directory = os.path.join(directory, name) if directory else None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Cached value for `key`, or None. Values are shared; don't mutate them."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        if self.directory and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key), "rb") as f:
+                    value = loads(f.read())
+            except Exception as e:
+                print(f"⚠️ Corrupt backtest cache entry {key}: {e}")
+            else:
+                self._remember(key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._remember(key, value)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{self._path(key)}.tmp"
+            try:
+                data = dumps(value)
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, self._path(key))
+            except Exception as e:
+                print(f"⚠️ Could not persist backtest cache entry {key}: {e}")
+
+    def _remember(self, key, value):
+        size = sizeof(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
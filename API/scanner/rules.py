@@ -0,0 +1,289 @@
+import ast
+import operator
+import threading
+import numpy as np
+from scanner import indicators
+
+# Setup rules are declared as boolean expressions over indicator columns,
+# e.g. "Close > prev_20d_high and RSI > 50". Each expression is parsed once
+# into a closure over NumPy arrays that reads the indicator columns it
+# references. The built-in rules can't be removed and between them use every
+# indicator, so the whole set is always computed. Rules are checked in
+# registry order: the first one that fires names the setup.
+
+OHLCV = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+# name -> (dependencies, function of the resolved dependency arrays)
+INDICATORS = {
+    'SMA_20': (('Close',), lambda c: indicators.rolling_mean(c, 20)),
+    'SMA_50': (('Close',), lambda c: indicators.rolling_mean(c, 50)),
+    'RSI': (('Close',), lambda c: indicators.wilder_rsi(c, 14)),
+    '20d_high': (('High',), lambda h: indicators.rolling_max(h, 20)),
+    'Avg_Volume_20': (('Volume',), lambda v: indicators.rolling_mean(v, 20)),
+    'prev_close': (('Close',), indicators.shift),
+    'prev_high': (('High',), indicators.shift),
+    'prev_low': (('Low',), indicators.shift),
+    'prev_sma20': (('SMA_20',), indicators.shift),
+    'prev_20d_high': (('20d_high',), indicators.shift),
+}
+
+# Helper flags, themselves expressions
+DERIVED = {
+    'Volume_Spike': "Volume > Avg_Volume_20 * 1.5",
+    'Big_Green': "Close > Open and Close > prev_high",
+    'RSI_Strength': "RSI > 55",
+    'Above_SMA20': "Close > SMA_20",
+}
+
+# calculate_technicals drops each ticker's first 49 bars (SMA_50 warm-up);
+# rules that need less history still respect it so results don't depend on
+# which rules are active.
+MIN_VALID_ROW = 49
+
+_COMPARE = {
+    ast.Gt: operator.gt, ast.GtE: operator.ge, ast.Lt: operator.lt,
+    ast.LtE: operator.le, ast.Eq: operator.eq, ast.NotEq: operator.ne,
+}
+_ARITH = {
+    ast.Add: operator.add, ast.Sub: operator.sub,
+    ast.Mult: operator.mul, ast.Div: operator.truediv,
+}
+
+
+def _compile_node(node, names):
+    if isinstance(node, ast.Expression):
+        return _compile_node(node.body, names)
+
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile_node(v, names) for v in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return lambda cols: combine.reduce([part(cols) for part in parts])
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        inner = _compile_node(node.operand, names)
+        return lambda cols: np.logical_not(inner(cols))
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        inner = _compile_node(node.operand, names)
+        return lambda cols: -inner(cols)
+
+    if isinstance(node, ast.Compare):
+        left = _compile_node(node.left, names)
+        steps = []
+        for op, comparator in zip(node.ops, node.comparators):
+            if type(op) not in _COMPARE:
+                raise ValueError(f"Unsupported comparison: {ast.dump(op)}")
+            steps.append((_COMPARE[type(op)], _compile_node(comparator, names)))
+
+        def compare(cols):
+            lhs = left(cols)
+            result = None
+            for fn, right in steps:
+                rhs = right(cols)
+                part = fn(lhs, rhs)
+                result = part if result is None else result & part
+                lhs = rhs
+            return result
+        return compare
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _ARITH:
+        fn = _ARITH[type(node.op)]
+        left, right = _compile_node(node.left, names), _compile_node(node.right, names)
+        return lambda cols: fn(left(cols), right(cols))
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        if name not in OHLCV and name not in INDICATORS and name not in DERIVED:
+            raise ValueError(f"Unknown column in rule: {name}")
+        names.add(name)
+        return lambda cols: cols[name]
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        value = float(node.value)
+        return lambda cols: value
+
+    raise ValueError(f"Unsupported expression: {ast.unparse(node)}")
+
+
+def compile_expression(expression):
+    """Parse a rule expression. Returns (evaluator, referenced column names)."""
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Invalid rule expression: {e}")
+    names = set()
+    return _compile_node(tree, names), names
+
+
+_DERIVED_COMPILED = {name: compile_expression(expr) for name, expr in DERIVED.items()}
+
+
+def _dependencies(names):
+    """Transitive closure of indicator/derived columns behind `names`."""
+    needed = set()
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        if name in needed:
+            continue
+        needed.add(name)
+        if name in INDICATORS:
+            stack.extend(INDICATORS[name][0])
+        elif name in DERIVED:
+            stack.extend(_DERIVED_COMPILED[name][1])
+    return needed
+
+
+def compute_columns(ohlcv, names):
+    """
+    Compute only the columns in `names` (and what they depend on) from a dict
+    of OHLCV arrays. Works on 1-D series and dates x tickers panels alike.
+    """
+    cols = {field: np.asarray(ohlcv[field], dtype=float) for field in OHLCV}
+
+    def resolve(name):
+        if name not in cols:
+            if name in INDICATORS:
+                deps, fn = INDICATORS[name]
+                cols[name] = fn(*[resolve(dep) for dep in deps])
+            else:
+                with np.errstate(invalid="ignore"):
+                    cols[name] = _DERIVED_COMPILED[name][0](_Resolver(resolve))
+        return cols[name]
+
+    for name in _dependencies(names):
+        resolve(name)
+    return cols
+
+
+class _Resolver:
+    # Lets derived expressions pull their inputs on demand
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def __getitem__(self, name):
+        return self._resolve(name)
+
+
+class Rule:
+    def __init__(self, name, label, expression, score=0, builtin=False):
+        self.name = name
+        self.label = label
+        self.expression = expression
+        self.score = score
+        self.builtin = builtin
+        self.evaluate, self.columns = compile_expression(expression)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "label": self.label,
+            "expression": self.expression,
+            "score": self.score,
+            "builtin": self.builtin,
+        }
+
+
+class CompiledRules:
+    """Snapshot of the registry: rules in priority order plus the columns they need."""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        needed = set()
+        for rule in self.rules:
+            needed |= rule.columns
+        self.columns = needed
+
+    def evaluate(self, ohlcv, extra_columns=()):
+        """
+        Returns (cols, flags, valid): computed columns, one boolean array per
+        rule name, and the rows calculate_technicals would keep.
+        """
+        cols = compute_columns(ohlcv, self.columns | set(extra_columns))
+        with np.errstate(invalid="ignore"):
+            flags = {
+                rule.name: np.broadcast_to(np.asarray(rule.evaluate(cols), dtype=bool), cols['Close'].shape)
+                for rule in self.rules
+            }
+
+        valid = np.cumsum(~np.isnan(cols['Close']), axis=0) > MIN_VALID_ROW
+        for arr in cols.values():
+            if arr.dtype != bool:
+                valid &= ~np.isnan(arr)
+        return cols, flags, valid
+
+    def label_for(self, flags_at_row):
+        """Setup label for one row given {rule name: bool}, by priority."""
+        for rule in self.rules:
+            if flags_at_row.get(rule.name, False):
+                return rule.label
+        return "No clear setup"
+
+    def score_for(self, label):
+        for rule in self.rules:
+            if rule.label == label:
+                return rule.score
+        return 0
+
+
+DEFAULT_RULES = [
+    Rule("Breakout", "Breakout setup", "Close > prev_20d_high", score=25, builtin=True),
+    Rule(
+        "Pullback_Bounce", "Pullback & bounce setup",
+        "Close > SMA_50 and prev_low < prev_sma20 and Close > prev_close",
+        score=15, builtin=True,
+    ),
+    Rule(
+        "Bullish_Momentum", "Bullish momentum setup",
+        "Volume_Spike and Big_Green and RSI_Strength and Above_SMA20",
+        score=20, builtin=True,
+    ),
+]
+
+_registry = list(DEFAULT_RULES)
+_compiled = CompiledRules(_registry)
+_lock = threading.Lock()
+
+
+def get_rules():
+    """Compiled snapshot of the active rules; cheap to call per scan."""
+    return _compiled
+
+
+def fingerprint():
+    """Hashable description of the active rules, for keying derived results."""
+    return tuple((r.name, r.expression) for r in _compiled.rules)
+
+
+def add_rule(name, label, expression, score=0, priority=None):
+    """
+    Register (or replace) a custom setup rule. `priority` is its position in
+    the evaluation order; by default it goes after the existing rules.
+    Raises ValueError for malformed expressions or clashing names.
+    """
+    global _compiled
+    if not name.isidentifier():
+        raise ValueError(f"Rule name must be an identifier: {name}")
+    if name in OHLCV or name in INDICATORS or name in DERIVED or name in indicators.FLAG_COLUMNS:
+        raise ValueError(f"Rule name clashes with a built-in column: {name}")
+
+    rule = Rule(name, label, expression, score=score)
+    with _lock:
+        rules = [r for r in _registry if r.name != name]
+        rules.insert(len(rules) if priority is None else priority, rule)
+        _registry[:] = rules
+        _compiled = CompiledRules(_registry)
+    return rule
+
+
+def remove_rule(name):
+    global _compiled
+    with _lock:
+        for rule in _registry:
+            if rule.name == name:
+                if rule.builtin:
+                    raise ValueError(f"Cannot remove built-in rule: {name}")
+                _registry.remove(rule)
+                _compiled = CompiledRules(_registry)
+                return True
+    return False
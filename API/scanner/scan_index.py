@@ -0,0 +1,129 @@
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+from scanner import data_loader, scoring
+
+# Ranked index of every setup in the universe, rebuilt by a background job so
+# /scan can answer from memory. Results are pre-sorted by score per price
+# bucket and per (bucket, setup type); a query is a slice.
+
+# Seconds between rebuilds (0 = no interval). Neither this nor DAILY_AT is set
+# by default, so no snapshot is built unless configured.
+REFRESH_SECONDS = int(os.getenv("SCAN_SNAPSHOT_SECONDS", "0"))
+# Optional daily rebuild at a local "HH:MM", e.g. "16:15" after the close
+DAILY_AT = os.getenv("SCAN_SNAPSHOT_DAILY_AT", "")
+
+PRICE_BUCKETS = ("all", "under_50", "over_50")
+
+
+def price_bucket(price_filter):
+    # Unrecognised filters mean no filtering, as in data_loader.get_tickers
+    bucket = data_loader.PRICE_FILTER_ALIASES.get(price_filter.lower(), price_filter.lower())
+    return bucket if bucket in PRICE_BUCKETS else "all"
+
+
+class ScanIndex:
+    def __init__(self, table, scores, built_at=None, universe_size=0):
+        """
+        Index a scored scan_panel_table (table and scores may be None when
+        nothing qualified). Rankings are kept for every tie-break option.
+        """
+        self.built_at = built_at or time.time()
+        self.universe_size = universe_size
+        self._ranked = {}
+        if table is None:
+            self._size = 0
+            return
+        self._size = len(scores)
+
+        for tie_break in (None,) + scoring.TIE_BREAKS:
+            order = scoring.top_k(table, scores, len(scores), tie_break)
+            ranked = [(i, scoring.scan_record(table, scores, i)) for i in order]
+            for bucket in PRICE_BUCKETS:
+                if bucket == "under_50":
+                    rows = [r for i, r in ranked if table['price'][i] <= 50]
+                elif bucket == "over_50":
+                    rows = [r for i, r in ranked if table['price'][i] > 50]
+                else:
+                    rows = [r for _, r in ranked]
+                self._ranked[(bucket, None, tie_break)] = rows
+                for r in rows:
+                    self._ranked.setdefault((bucket, r["type"].lower(), tie_break), []).append(r)
+
+    def __len__(self):
+        return self._size
+
+    def query(self, price_filter="All", limit=10, setup_type=None, tie_break=None):
+        """Best `limit` setups for a price filter, optionally of one setup type."""
+        if tie_break is not None and tie_break not in scoring.TIE_BREAKS:
+            raise ValueError(f"tie_break must be one of {', '.join(scoring.TIE_BREAKS)}")
+        key = (price_bucket(price_filter), setup_type.lower() if setup_type else None, tie_break)
+        return self._ranked.get(key, [])[:limit]
+
+
+_index = None
+_lock = threading.Lock()
+_refresh_requested = threading.Event()
+_worker = None
+
+
+def get_index():
+    """Latest snapshot, or None before the first build has finished."""
+    return _index
+
+
+def set_index(index):
+    global _index
+    _index = index
+
+
+def _seconds_until(hhmm):
+    now = datetime.now()
+    hour, minute = (int(part) for part in hhmm.split(":"))
+    target = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
+
+
+def _run(build, interval, daily_at):
+    while True:
+        try:
+            started = time.time()
+            set_index(build())
+            print(f"✅ Scan snapshot rebuilt: {len(_index)} setups in {time.time() - started:.1f}s")
+        except Exception as e:
+            print(f"⚠️ Scan snapshot refresh failed: {e}")
+        waits = [interval] if interval > 0 else []
+        if daily_at:
+            waits.append(_seconds_until(daily_at))
+        _refresh_requested.wait(min(waits) if waits else None)
+        _refresh_requested.clear()
+
+
+def snapshot_enabled():
+    """Whether a rebuild interval or daily time is configured."""
+    return REFRESH_SECONDS > 0 or bool(DAILY_AT)
+
+
+def start_scheduler(build, interval=None, daily_at=None):
+    """
+    Rebuild the snapshot with `build()` now, then every `interval` seconds
+    and/or daily at `daily_at` ("HH:MM"), on a daemon thread. Safe to call
+    more than once.
+    """
+    global _worker
+    interval = REFRESH_SECONDS if interval is None else interval
+    daily_at = DAILY_AT if daily_at is None else daily_at
+    with _lock:
+        if _worker is not None and _worker.is_alive():
+            return _worker
+        _worker = threading.Thread(target=_run, args=(build, interval, daily_at), daemon=True)
+        _worker.start()
+    return _worker
+
+
+def request_refresh():
+    """Ask the scheduler to rebuild early (e.g. right after the market close)."""
+    _refresh_requested.set()
@@ -0,0 +1,81 @@
+import heapq
+import numpy as np
+from scanner import rules
+
+# Setup scoring over scan_panel_table output: the 0-100 setup score used by
+# /scan and the scan snapshot, computed for every candidate at once, plus a
+# heap-based top-k for picking the best of a full-universe scan.
+
+TIE_BREAKS = ("rsi", "volume_spike")
+
+# Panel columns score_setups reads (as the table's rsi, Volume_Spike and
+# Above_SMA20); scans compute these on top of what the rules need
+SCORE_COLUMNS = ('RSI', 'Volume_Spike', 'Above_SMA20')
+
+
+def concat_tables(tables):
+    """Stack scan_panel_table dicts column by column (None entries are skipped)."""
+    tables = [t for t in tables if t is not None and len(t['ticker'])]
+    if not tables:
+        return None
+    return {key: np.concatenate([t[key] for t in tables]) for key in tables[0]}
+
+
+def score_setups(table):
+    """
+    One int score per row of `table`: 50, plus the setup's rule score, plus
+    15 for RSI in 50-70 (-5 above 70, -10 below 30), 10 for a volume spike
+    and 5 above SMA 20, clipped to 0-100.
+    """
+    compiled = rules.get_rules()
+    setup = table['setup']
+    bonus = np.zeros(len(setup))
+    for label in set(setup):
+        bonus[setup == label] = compiled.score_for(label)
+
+    rsi = np.asarray(table['rsi'], dtype=float)
+    with np.errstate(invalid="ignore"):
+        rsi_points = np.select(
+            [(rsi >= 50) & (rsi <= 70), rsi > 70, rsi < 30],
+            [15, -5, -10],
+            default=0,
+        )
+    score = (
+        50 + bonus + rsi_points
+        + np.where(table['Volume_Spike'], 10, 0)
+        + np.where(table['Above_SMA20'], 5, 0)
+    )
+    return np.clip(score, 0, 100).astype(int)
+
+
+def top_k(table, scores, k, tie_break=None):
+    """
+    Row indices of the `k` best scores, best first. Equal scores are ordered
+    by `tie_break` ("rsi": higher RSI first, "volume_spike": spikes first),
+    then by ticker.
+    """
+    if tie_break is not None and tie_break not in TIE_BREAKS:
+        raise ValueError(f"tie_break must be one of {', '.join(TIE_BREAKS)}")
+
+    if tie_break == "rsi":
+        secondary = np.nan_to_num(np.asarray(table['rsi'], dtype=float), nan=-np.inf)
+    elif tie_break == "volume_spike":
+        secondary = np.asarray(table['Volume_Spike'], dtype=float)
+    else:
+        secondary = np.zeros(len(scores))
+
+    # nlargest is stable, so visiting rows in ticker order breaks the last ties
+    order = np.argsort(table['ticker'], kind="stable")
+    return heapq.nlargest(k, order.tolist(), key=lambda i: (scores[i], secondary[i]))
+
+
+def scan_record(table, scores, i):
+    """/scan result entry for row `i` of a scored table."""
+    rsi = float(table['rsi'][i])
+    return {
+        "ticker": table['ticker'][i],
+        "score": int(scores[i]),
+        "type": table['setup'][i].replace(" setup", "").title(),
+        "price": round(float(table['price'][i]), 2),
+        "rsi": round(rsi, 1) if not np.isnan(rsi) else None
+    }
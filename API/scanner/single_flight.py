@@ -0,0 +1,116 @@
+import os
+import copy
+import time
+import threading
+from collections import OrderedDict
+
+# Request coalescing. Concurrent callers asking for the same key wait on the
+# one call already in flight and share its result instead of each fetching
+# or computing it again; the result is then kept for a few seconds so a burst
+# of requests arriving just after it finished is served from memory too.
+# Failures are shared with the callers that were waiting but never cached;
+# each waiter raises its own copy, chained to the original, so concurrent
+# handlers never share (and grow) one exception's traceback.
+
+TTL_SECONDS = float(os.getenv("SINGLE_FLIGHT_TTL_SECONDS", "5"))
+MAX_ENTRIES = int(os.getenv("SINGLE_FLIGHT_MAX_ENTRIES", "1024"))
+
+
+_flights = []
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def _copy_error(error):
+    """A fresh instance of `error` for one waiting caller."""
+    try:
+        copied = copy.copy(error)
+    except Exception:
+        # Exceptions whose __init__ doesn't take their args back
+        copied = type(error).__new__(type(error), *error.args)
+        copied.__dict__.update(error.__dict__)
+    copied.__traceback__ = None
+    return copied
+
+
+class SingleFlight:
+    def __init__(self, name, ttl=None, max_entries=None):
+        self.name = name
+        self.ttl = TTL_SECONDS if ttl is None else ttl
+        self.max_entries = MAX_ENTRIES if max_entries is None else max_entries
+        self._calls = {}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+        self.hits = 0
+        _flights.append(self)
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Result of `fn(*args, **kwargs)`, run at most once at a time per key.
+        Results are shared between callers; don't mutate them.
+        """
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._results.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise _copy_error(call.error) from call.error
+            return call.value
+
+        try:
+            call.value = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.ttl > 0:
+                    self._results[key] = (time.monotonic() + self.ttl, call.value)
+                    self._results.move_to_end(key)
+                    while len(self._results) > self.max_entries:
+                        self._results.popitem(last=False)
+            call.done.set()
+        return call.value
+
+    def forget(self, key=None):
+        """Drop one cached result, or all of them."""
+        with self._lock:
+            if key is None:
+                self._results.clear()
+            else:
+                self._results.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "shared": self.shared,
+                "hits": self.hits,
+                "in_flight": len(self._calls),
+                "cached": len(self._results),
+            }
+
+
+def stats():
+    """Counters of every SingleFlight, by name."""
+    return {flight.name: flight.stats() for flight in _flights}
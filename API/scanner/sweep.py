@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+from scanner import data_loader
+from scanner.backtester import HOLD_BARS, screen_setup, setup_signals
+
+# Parameter sweeps over run_backtest. Prices are loaded and signals computed
+# once per ticker; every (hold, min_gain, risk_per_trade, initial_balance)
+# combination is then evaluated together by broadcasting over padded trade
+# return arrays, instead of re-running the backtest per combination.
+
+RANK_COLUMNS = ("win_rate", "total_return")
+
+
+def _prepare(frames, tickers):
+    """
+    (close, signals) per ticker with a current setup, in `tickers` order.
+    Setups on histories too short to trade on get empty arrays: they count
+    as found, like in run_backtest, but never trade.
+    """
+    prepared = []
+    for ticker in tickers:
+        df = frames.get(ticker)
+        if df is None or df.empty:
+            continue
+        try:
+            found, df = screen_setup(df)
+        except Exception:
+            continue
+        if not found:
+            continue
+        if df is None:
+            prepared.append((np.empty(0), np.zeros(0, dtype=bool)))
+        else:
+            prepared.append((df['Close'].to_numpy(dtype=float), setup_signals(df)))
+    return prepared
+
+
+def _trade_returns(prepared, holds):
+    """
+    Per-trade returns padded to a (holds, tickers, max trades) array with 0
+    after each ticker's last trade, plus the matching mask.
+    """
+    per_hold = []
+    for hold in holds:
+        row = []
+        for close, signals in prepared:
+            entries = np.flatnonzero(signals[:max(len(close) - hold, 0)])
+            row.append(close[entries + hold] / close[entries] - 1)
+        per_hold.append(row)
+
+    width = max([len(r) for row in per_hold for r in row] + [1])
+    returns = np.zeros((len(holds), len(prepared), width))
+    mask = np.zeros(returns.shape, dtype=bool)
+    for h, row in enumerate(per_hold):
+        for t, r in enumerate(row):
+            returns[h, t, :len(r)] = r
+            mask[h, t, :len(r)] = True
+    return returns, mask
+
+
+def evaluate_grid(prepared, holds, min_gains, risk_per_trades, initial_balances):
+    """
+    Evaluate every parameter combination over prepared (close, signals)
+    pairs. Returns one row per combination with the figures run_backtest and
+    summarize_backtest would report for it.
+    """
+    holds = [int(h) for h in holds]
+    gains = np.asarray(min_gains, dtype=float)
+    risks = np.asarray(risk_per_trades, dtype=float)
+    balances = np.asarray(initial_balances, dtype=float)
+
+    returns, mask = _trade_returns(prepared, holds)        # (H, T, M)
+    counts = mask.sum(axis=2)                              # (H, T)
+    total_trades = counts.sum(axis=1)                      # (H,)
+    has_trades = counts > 0
+
+    # Balance per unit of initial balance, before and after each trade
+    r = risks[:, None, None, None]
+    growth = 1 + r * returns                               # (R, H, T, M)
+    after = np.cumprod(growth, axis=3)
+    before = np.concatenate([np.ones(after.shape[:3] + (1,)), after[..., :-1]], axis=3)
+    pnl = before * r * returns                             # (R, H, T, M)
+
+    # Success: the last trade of each ticker beats min_gain * initial_balance
+    last = np.maximum(counts - 1, 0)[None, :, :, None]
+    last_pnl = np.take_along_axis(pnl, last, axis=3)[..., 0]          # (R, H, T)
+    last_pnl = balances[:, None, None, None] * last_pnl[None]         # (B, R, H, T)
+    beats = last_pnl[None] > gains[:, None, None, None, None] * balances[None, :, None, None, None]
+    successful = (beats & has_trades).sum(axis=4)                     # (G, B, R, H)
+
+    # Trade stats over all tickers' trades concatenated in ticker order,
+    # as summarize_backtest sees them
+    with np.errstate(invalid="ignore", divide="ignore"):
+        trade_win_rate = ((returns > 0) & mask).sum(axis=(1, 2)) / total_trades    # (H,)
+        avg_gain = np.where(mask, pnl, 0.0).sum(axis=(2, 3)) / total_trades         # (R, H)
+
+    first = np.argmax(has_trades, axis=1)                              # (H,)
+    final = has_trades.shape[1] - 1 - np.argmax(has_trades[:, ::-1], axis=1)
+    hold_idx = np.arange(len(holds))
+    start = after[:, hold_idx, first, 0]                               # (R, H)
+    end = np.take_along_axis(after, last, axis=3)[..., 0][:, hold_idx, final]
+    total_return = end - start
+
+    flat = after.reshape(after.shape[:2] + (-1,))
+    flat_mask = mask.reshape(mask.shape[0], -1)[None]
+    peak = np.maximum.accumulate(np.where(flat_mask, flat, -np.inf), axis=2)
+    drawdown = np.where(flat_mask, peak - flat, 0.0).max(axis=2)       # (R, H)
+
+    rows = []
+    for g, min_gain in enumerate(gains):
+        for b, balance in enumerate(balances):
+            for ri, risk in enumerate(risks):
+                for h, hold in enumerate(holds):
+                    trades = int(total_trades[h])
+                    # Like run_backtest, setups only count when some trade happened
+                    found = len(prepared) if trades else 0
+                    wins = int(successful[g, b, ri, h]) if trades else 0
+                    rows.append({
+                        "hold": hold,
+                        "min_gain": float(min_gain),
+                        "risk_per_trade": float(risk),
+                        "initial_balance": float(balance),
+                        "setups_found": found,
+                        "successful": wins,
+                        "win_rate": round(wins / found * 100, 2) if found else 0,
+                        "total_trades": trades,
+                        "trade_win_rate": round(trade_win_rate[h] * 100, 1) if trades else 0,
+                        "total_return": round(balance * total_return[ri, h], 2) if trades else 0,
+                        "avg_gain": round(balance * avg_gain[ri, h], 2) if trades else 0,
+                        "max_drawdown": round(balance * drawdown[ri, h], 2) if trades else 0,
+                    })
+    return pd.DataFrame(rows)
+
+
+def run_sweep(tickers, period="1y", holds=(HOLD_BARS,), min_gains=(0.05,),
+              risk_per_trades=(0.01,), initial_balances=(10000,),
+              rank_by="win_rate", top=None):
+    """
+    Backtest every combination of the given parameter grids over `tickers`.
+    Returns (table, failed): a DataFrame with one row per combination, best
+    first by `rank_by` ("win_rate" or "total_return"), and the tickers whose
+    data could not be loaded.
+    """
+    if rank_by not in RANK_COLUMNS:
+        raise ValueError(f"rank_by must be one of {', '.join(RANK_COLUMNS)}")
+    if not (holds and min_gains and risk_per_trades and initial_balances):
+        raise ValueError("Every parameter grid needs at least one value")
+    if min(holds) < 1:
+        raise ValueError("Hold periods must be at least one bar")
+    if top is not None and top < 0:
+        raise ValueError("top must not be negative")
+
+    frames, failed = data_loader.get_data_many(tickers, period=period, interval="1d")
+    prepared = _prepare(frames, tickers)
+
+    table = evaluate_grid(prepared, holds, min_gains, risk_per_trades, initial_balances)
+    tiebreak = "total_return" if rank_by == "win_rate" else "win_rate"
+    table = table.sort_values([rank_by, tiebreak], ascending=False, kind="stable").reset_index(drop=True)
+    if top is not None:
+        table = table.head(top)
+    return table, sorted(failed)
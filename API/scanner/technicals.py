@@ -1,7 +1,18 @@
+import os
+import numpy as np
 import pandas as pd
 import pandas_ta as ta
+from scanner import data_loader, indicators, rules, scoring, single_flight
 
-def calculate_technicals(df):
+# "numpy" uses the array kernels in scanner.indicators, "pandas" the original
+# pandas_ta implementation. Both produce the same columns and rows.
+TECHNICALS_ENGINE = os.getenv("TECHNICALS_ENGINE", "numpy")
+
+# Bars latest_signals looks at. Every indicator except RSI has a finite window
+# (50 bars at most); RSI's Wilder average forgets its seed well within 250 bars.
+SIGNAL_LOOKBACK = 250
+
+def calculate_technicals(df, engine=None):
     if df is None or df.empty:
         raise ValueError("DataFrame is empty or None.")
 
@@ -10,16 +21,23 @@ def calculate_technicals(df):
         if col not in df.columns:
             raise ValueError(f"Missing column: {col}")
 
-    df = df.copy()
-
     # Bail out early if not enough data
     if len(df) < 30:
         return pd.DataFrame()
 
-    # Indicators
-    df['SMA_20'] = ta.sma(df['Close'], length=20)
-    df['SMA_50'] = ta.sma(df['Close'], length=50)
-    df['RSI'] = ta.rsi(df['Close'], length=14)
+    engine = engine or TECHNICALS_ENGINE
+    if engine == "numpy":
+        return _add_custom_rule_columns(_calculate_technicals_numpy(df))
+    if engine != "pandas":
+        raise ValueError(f"Unknown technicals engine: {engine}")
+
+    df = df.copy()
+
+    # Indicators (pandas_ta's own formulas even if TA-Lib is installed, so
+    # results don't depend on it and the numpy engine matches them)
+    df['SMA_20'] = ta.sma(df['Close'], length=20, talib=False)
+    df['SMA_50'] = ta.sma(df['Close'], length=50, talib=False)
+    df['RSI'] = ta.rsi(df['Close'], length=14, talib=False)
     df['20d_high'] = df['High'].rolling(window=20).max()
     df['Avg_Volume_20'] = df['Volume'].rolling(window=20).mean()
 
@@ -54,6 +72,347 @@ def calculate_technicals(df):
         df['Above_SMA20']
     )
 
+    return _add_custom_rule_columns(df)
+
+
+# Concurrent requests for the same bars and indicator set share one computation
+_technicals_flight = single_flight.SingleFlight("technicals")
+
+def get_technicals(ticker, period="6mo", interval="1d", engine=None):
+    """
+    get_data plus calculate_technicals for one ticker, coalesced per
+    (ticker, bars, engine, active rules). The frame is shared between
+    callers; don't mutate it.
+    """
+    df = data_loader.get_data(ticker, period=period, interval=interval)
+    if df.empty:
+        return df
+    engine = engine or TECHNICALS_ENGINE
+    key = (
+        ticker, interval, data_loader.get_data_version(ticker, interval),
+        str(df.index[0]), len(df), engine, rules.fingerprint(),
+    )
+    return _technicals_flight.do(key, calculate_technicals, df, engine)
+
+
+def _ohlcv_arrays(df):
+    return [df[col].to_numpy(dtype=float) for col in ('Open', 'High', 'Low', 'Close', 'Volume')]
+
+
+def _calculate_technicals_numpy(df):
+    ohlcv = _ohlcv_arrays(df)
+    values, valid = indicators.compute_indicators(*ohlcv)
+    flags = indicators.compute_flags(*ohlcv, values)
+
+    # Same rows dropna() keeps in the pandas engine: indicators defined and
+    # no gaps in the input columns themselves
+    valid &= ~df.isna().to_numpy().any(axis=1)
+    columns = {name: values[i, valid] for i, name in enumerate(indicators.INDICATOR_COLUMNS)}
+    columns.update({name: flags[i, valid] for i, name in enumerate(indicators.FLAG_COLUMNS)})
+
+    base = df.iloc[np.flatnonzero(valid)]
+    return pd.concat([base, pd.DataFrame(columns, index=base.index)], axis=1)
+
+
+PANEL_FIELDS = ('Open', 'High', 'Low', 'Close', 'Volume')
+
+
+# Columns signal records carry besides the rule flags: the scorer's inputs
+# plus the averages shown alongside each setup
+RECORD_COLUMNS = scoring.SCORE_COLUMNS + ('SMA_20', 'SMA_50')
+
+
+def latest_signals(df, bars=1, lookback=SIGNAL_LOOKBACK):
+    """
+    Fast path for is_valid_setup/describe_setup: evaluates the setup rules on
+    the last `bars` rows calculate_technicals would keep, using only the tail
+    of the history and no intermediate DataFrame. Returns one record per row
+    (oldest first) with the setup label, RSI, price and flags; 'valid' says
+    whether is_valid_setup would accept that row as the latest.
+    """
+    if df is None or len(df) < 30:
+        return []
+
+    window = df.iloc[-(lookback + bars - 1):] if lookback else df
+    compiled = rules.get_rules()
+    cols, flags, valid = compiled.evaluate(
+        {field: window[field].to_numpy(dtype=float) for field in PANEL_FIELDS},
+        extra_columns=RECORD_COLUMNS,
+    )
+
+    rows = np.flatnonzero(valid)
+    eligible = len(rows) >= 30
+
+    records = []
+    for i in rows[-bars:]:
+        record = {name: bool(flag[i]) for name, flag in flags.items()}
+        record['Volume_Spike'] = bool(cols['Volume_Spike'][i])
+        record['Above_SMA20'] = bool(cols['Above_SMA20'][i])
+        setup = compiled.label_for(record)
+        record.update({
+            "date": window.index[i],
+            "setup": setup,
+            "valid": eligible and setup != "No clear setup",
+            "price": float(cols['Close'][i]),
+            "rsi": float(cols['RSI'][i]),
+            "sma_20": float(cols['SMA_20'][i]),
+            "sma_50": float(cols['SMA_50'][i]),
+        })
+        records.append(record)
+    return records
+
+
+def panel_problem(df):
+    """Why a frame can't go into a panel, or None if it can."""
+    if df is None or df.empty:
+        return "DataFrame is empty or None."
+    missing = [col for col in PANEL_FIELDS if col not in df.columns]
+    if missing:
+        return f"Missing column: {missing[0]}"
+    if not df.index.is_unique:
+        return "duplicate dates in index"
+    return None
+
+
+def group_frames(frames, max_size=None):
+    """
+    Split frames into groups that share one calendar (identical index), in
+    first-seen order, each at most `max_size` tickers. Panels built from a
+    group have no gaps, so rolling windows match the per-ticker path; mixing
+    calendars would put NaN bars in the windows. Frames build_panel would
+    reject are skipped with a warning.
+    """
+    groups = []
+    for ticker, df in frames.items():
+        problem = panel_problem(df)
+        if problem:
+            print(f"Error processing {ticker}: {problem}")
+            continue
+        for index, members in groups:
+            if df.index is index or df.index.equals(index):
+                members[ticker] = df
+                break
+        else:
+            groups.append((df.index, {ticker: df}))
+
+    out = []
+    for _, members in groups:
+        tickers = list(members)
+        step = max_size or len(tickers)
+        for i in range(0, len(tickers), step):
+            out.append({ticker: members[ticker] for ticker in tickers[i:i + step]})
+    return out
+
+
+def build_panel(frames):
+    """
+    Align per-ticker OHLCV frames on the union of their dates. Returns a dict
+    with 'dates', 'tickers' and one dates x tickers float array per field;
+    bars a ticker doesn't have are NaN. Indicators over a union panel see
+    those gaps, so evaluate setups on panels from group_frames instead.
+    Frames that can't be aligned (no OHLCV, duplicate dates, non-numeric
+    values) are skipped with a warning.
+    """
+    usable = {}
+    for ticker, df in frames.items():
+        problem = panel_problem(df)
+        if problem:
+            print(f"Error processing {ticker}: {problem}")
+            continue
+        usable[ticker] = df
+
+    # Tickers on the same calendar share one index; only union when they differ
+    first = next(iter(usable.values()), None)
+    dates = first.index if first is not None else pd.DatetimeIndex([])
+    aligned = all(df.index is dates or df.index.equals(dates) for df in usable.values())
+    if not aligned:
+        for df in usable.values():
+            dates = dates.union(df.index)
+
+    values = np.full((len(PANEL_FIELDS), len(dates), len(usable)), np.nan)
+    tickers = []
+    columns, positions = None, None
+    for ticker, df in usable.items():
+        j = len(tickers)
+        try:
+            if columns is None or not df.columns.equals(columns):
+                columns, positions = df.columns, df.columns.get_indexer(PANEL_FIELDS)
+            block = df.to_numpy(dtype=float)[:, positions].T
+            if aligned:
+                values[:, :, j] = block
+            else:
+                values[:, dates.get_indexer(df.index), j] = block
+        except Exception as e:
+            print(f"Error processing {ticker}: {e}")
+            values[:, :, j] = np.nan
+            continue
+        tickers.append(ticker)
+    values = values[:, :, :len(tickers)]
+
+    panel = {'dates': dates, 'tickers': tickers}
+    for i, field in enumerate(PANEL_FIELDS):
+        panel[field] = values[i]
+    return panel
+
+
+def calculate_panel(panel):
+    """
+    calculate_technicals for a whole panel in one pass. Returns a dict of
+    dates x tickers arrays keyed by the same column names, plus 'valid'
+    (rows calculate_technicals would keep).
+    """
+    ohlcv = [panel[field] for field in PANEL_FIELDS]
+    values, valid = indicators.compute_indicators(*ohlcv)
+    flags = indicators.compute_flags(*ohlcv, values)
+    for arr in ohlcv:
+        valid &= ~np.isnan(arr)
+
+    result = {name: values[i] for i, name in enumerate(indicators.INDICATOR_COLUMNS)}
+    result.update({name: flags[i] for i, name in enumerate(indicators.FLAG_COLUMNS)})
+    result['valid'] = valid
+    return result
+
+
+def calculate_technicals_many(frames):
+    """
+    calculate_technicals for several tickers at once. Tickers that share a
+    calendar are computed together as one panel (mixing calendars would
+    change the rolling windows, so each calendar gets its own panel).
+
+    Returns (results, failed): ticker -> the DataFrame calculate_technicals
+    would return, and ticker -> reason for frames it would reject.
+    """
+    results, failed = {}, {}
+    eligible = {}
+    for ticker, df in frames.items():
+        if df is None or df.empty:
+            failed[ticker] = "DataFrame is empty or None."
+            continue
+        missing = [col for col in PANEL_FIELDS if col not in df.columns]
+        if missing:
+            failed[ticker] = f"Missing column: {missing[0]}"
+            continue
+        if len(df) < 30:
+            results[ticker] = pd.DataFrame()
+            continue
+        if TECHNICALS_ENGINE != "numpy" or not df.index.is_unique:
+            # Frames a panel can't hold go through the per-ticker path
+            results[ticker] = calculate_technicals(df)
+            continue
+        eligible[ticker] = df
+
+    custom = [rule for rule in rules.get_rules().rules if not rule.builtin]
+    for members in group_frames(eligible):
+        panel = build_panel(members)
+        computed = calculate_panel(panel)
+        names = list(indicators.INDICATOR_COLUMNS) + list(indicators.FLAG_COLUMNS)
+
+        # Custom rule columns for the whole panel, as _add_custom_rule_columns
+        # would add them to each frame
+        arrays = {field: panel[field] for field in PANEL_FIELDS}
+        arrays.update({name: computed[name] for name in names})
+        with np.errstate(invalid="ignore"):
+            for rule in custom:
+                computed[rule.name] = np.broadcast_to(np.asarray(rule.evaluate(arrays), dtype=bool), computed['valid'].shape)
+        names += [rule.name for rule in custom]
+
+        for j, ticker in enumerate(panel['tickers']):
+            df = members[ticker]
+            # Like the numpy engine, also drop rows with gaps in any input column
+            rows = np.flatnonzero(computed['valid'][:, j] & ~df.isna().to_numpy().any(axis=1))
+            base = df.iloc[rows]
+            columns = pd.DataFrame({name: computed[name][rows, j] for name in names}, index=base.index)
+            results[ticker] = pd.concat([base, columns], axis=1)
+    return results, failed
+
+
+def scan_panel_table(panel, extra_columns=scoring.SCORE_COLUMNS):
+    """
+    Columnar form of scan_panel: a dict of equal-length arrays ('ticker',
+    'setup', 'price', 'rsi', 'sma_20', 'sma_50', 'Volume_Spike',
+    'Above_SMA20'), one entry per qualifying ticker in panel order.
+    Only the rules' columns and `extra_columns` are computed (by default what
+    score_setups needs); fields for columns that weren't are NaN.
+    """
+    tickers = panel['tickers']
+    empty = {
+        'ticker': np.array([], dtype=object), 'setup': np.array([], dtype=object),
+        'price': np.array([]), 'rsi': np.array([]), 'sma_20': np.array([]), 'sma_50': np.array([]),
+        'Volume_Spike': np.array([], dtype=bool), 'Above_SMA20': np.array([], dtype=bool),
+    }
+    if not tickers or len(panel['dates']) == 0:
+        return empty
+
+    compiled = rules.get_rules()
+    cols, flags, valid = compiled.evaluate(panel, extra_columns=extra_columns)
+    n = len(valid)
+    last = n - 1 - np.argmax(valid[::-1], axis=0)
+    index = np.arange(len(tickers))
+
+    def at_last(arr):
+        return arr[last, index]
+
+    def column(name, missing=np.nan):
+        if name not in cols:
+            return np.full(len(tickers), missing)
+        return at_last(cols[name])
+
+    eligible = valid.sum(axis=0) >= 30
+    fired = {name: at_last(flag) & eligible for name, flag in flags.items()}
+    if not fired:
+        return empty
+
+    # Position of the first rule that fires, in priority order
+    first = np.full(len(tickers), -1)
+    for k in reversed(range(len(compiled.rules))):
+        first = np.where(fired[compiled.rules[k].name], k, first)
+    hits = np.flatnonzero(first >= 0)
+    labels = np.array([rule.label for rule in compiled.rules], dtype=object)
+
+    return {
+        'ticker': np.asarray(tickers, dtype=object)[hits],
+        'setup': labels[first[hits]],
+        'price': column('Close')[hits],
+        'rsi': column('RSI')[hits],
+        'sma_20': column('SMA_20')[hits],
+        'sma_50': column('SMA_50')[hits],
+        'Volume_Spike': column('Volume_Spike', False)[hits].astype(bool),
+        'Above_SMA20': column('Above_SMA20', False)[hits].astype(bool),
+    }
+
+
+def scan_panel(panel):
+    """
+    Evaluate is_valid_setup/describe_setup for every ticker in a panel using
+    the active setup rules. Each ticker is judged on its last valid row, like
+    the per-ticker path. Returns one dict per qualifying ticker, in panel order.
+    """
+    table = scan_panel_table(panel, extra_columns=RECORD_COLUMNS)
+    return [
+        {
+            "ticker": table['ticker'][i],
+            "setup": table['setup'][i],
+            "price": float(table['price'][i]),
+            "rsi": float(table['rsi'][i]),
+            "sma_20": float(table['sma_20'][i]),
+            "sma_50": float(table['sma_50'][i]),
+            "Volume_Spike": bool(table['Volume_Spike'][i]),
+            "Above_SMA20": bool(table['Above_SMA20'][i]),
+        }
+        for i in range(len(table['ticker']))
+    ]
+
+
+def _add_custom_rule_columns(df):
+    """One boolean column per user-registered rule, on calculate_technicals output."""
+    custom = [rule for rule in rules.get_rules().rules if not rule.builtin]
+    if not custom or df.empty:
+        return df
+    arrays = {name: df[name].to_numpy(dtype=float) for name in df.columns if df[name].dtype != bool}
+    arrays.update({name: df[name].to_numpy() for name in df.columns if df[name].dtype == bool})
+    with np.errstate(invalid="ignore"):
+        for rule in custom:
+            df[rule.name] = np.broadcast_to(np.asarray(rule.evaluate(arrays), dtype=bool), len(df))
     return df
 
 
@@ -62,20 +421,10 @@ def is_valid_setup(df):
         return False
 
     latest = df.iloc[-1]
-    return bool(
-        latest.get('Breakout', False) or
-        latest.get('Pullback_Bounce', False) or
-        latest.get('Bullish_Momentum', False)
-    )
+    return any(bool(latest.get(rule.name, False)) for rule in rules.get_rules().rules)
 
 
 def describe_setup(df):
     latest = df.iloc[-1]
-    if latest.get('Breakout', False):
-        return "Breakout setup"
-    elif latest.get('Pullback_Bounce', False):
-        return "Pullback & bounce setup"
-    elif latest.get('Bullish_Momentum', False):
-        return "Bullish momentum setup"
-    else:
-        return "No clear setup"
+    compiled = rules.get_rules()
+    return compiled.label_for({rule.name: bool(latest.get(rule.name, False)) for rule in compiled.rules})
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+from scanner import data_loader
+from scanner.backtester import HOLD_BARS, MIN_BACKTEST_ROWS, setup_signals, summarize_backtest
+from scanner.technicals import calculate_technicals
+
+# Walk-forward backtests: a long history is cut into rolling train/test
+# windows and each one is summarized separately. Indicators, signals and
+# trades are computed once over the full series; a window only selects the
+# trades that open and close inside it and re-compounds their balances, so
+# adding windows costs little beyond the one full pass.
+#
+# Unlike run_backtest, tickers are not screened on their latest bar (that
+# would leak the future into every window), and windows use indicators
+# warmed up on the preceding history rather than restarting at each edge.
+
+# Smallest balance growth factor of one trade. A trade risking the whole
+# balance on a stock that goes to zero busts the account; flooring the factor
+# keeps the log-cumsum below finite (the balance just stays ~0 afterwards).
+BUST_GROWTH = 1e-12
+
+
+def _trades(frames, tickers, holds):
+    """
+    Every trade over the full history, per hold period, as flat arrays
+    ordered by ticker then entry, with entries/exits as positions on the
+    shared date axis.
+    """
+    prepared = []
+    for ticker in tickers:
+        df = frames.get(ticker)
+        if df is None or df.empty:
+            continue
+        try:
+            df = calculate_technicals(df)
+        except Exception:
+            continue
+        if len(df) < MIN_BACKTEST_ROWS:
+            continue
+        prepared.append((df.index, df['Close'].to_numpy(dtype=float), setup_signals(df)))
+
+    dates = pd.DatetimeIndex(sorted(set().union(*[index for index, _, _ in prepared])))
+
+    trades = {}
+    for hold in holds:
+        parts = []
+        for t, (index, close, signals) in enumerate(prepared):
+            entries = np.flatnonzero(signals[:max(len(close) - hold, 0)])
+            exits = entries + hold
+            positions = dates.get_indexer(index)
+            parts.append((
+                positions[entries], positions[exits],
+                close[exits] / close[entries] - 1,
+                np.full(len(entries), t),
+            ))
+        if parts:
+            entry, exit_, ret, ticker = (np.concatenate(p) for p in zip(*parts))
+        else:
+            entry = exit_ = ticker = np.zeros(0, dtype=int)
+            ret = np.zeros(0)
+        trades[hold] = {"entry": entry, "exit": exit_, "return": ret, "ticker": ticker}
+    return dates, trades
+
+
+def _segment(trades, start, end, initial_balance, risk_per_trade):
+    """
+    Trades that open and close within date positions [start, end), with
+    balances compounded per ticker from initial_balance as if the backtest
+    had run on that window alone.
+    """
+    sel = (trades["entry"] >= start) & (trades["exit"] < end)
+    ret, ticker = trades["return"][sel], trades["ticker"][sel]
+    if len(ret) == 0:
+        return pd.DataFrame()
+
+    # Per-ticker cumprod of growth factors via a segmented log-cumsum
+    growth = np.maximum(1 + risk_per_trade * ret, BUST_GROWTH)
+    log_growth = np.log(growth)
+    cum = np.cumsum(log_growth)
+    first = np.flatnonzero(np.r_[True, ticker[1:] != ticker[:-1]])
+    offset = np.repeat(cum[first] - log_growth[first], np.diff(np.r_[first, len(ret)]))
+    balance = initial_balance * np.exp(cum - offset)
+    pnl = balance / growth * (growth - 1)
+    return pd.DataFrame({"pnl": pnl, "balance": balance})
+
+
+def _stats(results_df):
+    stats = summarize_backtest(results_df)
+    stats.pop("summary")
+    return stats
+
+
+def walk_forward(tickers, period="5y", train_bars=252, test_bars=63, step_bars=None,
+                 holds=(HOLD_BARS,), risk_per_trade=0.01, initial_balance=10000):
+    """
+    Rolling walk-forward backtest. Windows are `train_bars` of training
+    followed by `test_bars` of testing, advancing by `step_bars` (default
+    test_bars). When several hold periods are given, each window picks the
+    one with the best training return and reports its out-of-sample stats.
+
+    Returns (windows, failed): a list of dicts with the window dates, the
+    chosen hold and summarize_backtest stats for the train and test parts,
+    and the tickers whose data could not be loaded.
+    """
+    if train_bars < 1 or test_bars < 1:
+        raise ValueError("train_bars and test_bars must be positive")
+    if not holds or min(holds) < 1:
+        raise ValueError("Hold periods must be at least one bar")
+    if not 0 < risk_per_trade <= 1:
+        raise ValueError("risk_per_trade must be in (0, 1], i.e. risk between 0 and 100%")
+    step_bars = step_bars or test_bars
+
+    frames, failed = data_loader.get_data_many(tickers, period=period, interval="1d")
+    if not frames:
+        return [], sorted(failed)
+    dates, trades = _trades(frames, tickers, [int(h) for h in holds])
+
+    windows = []
+    for start in range(0, len(dates) - train_bars - test_bars + 1, step_bars):
+        split, end = start + train_bars, start + train_bars + test_bars
+
+        train = {
+            hold: _stats(_segment(trades[hold], start, split, initial_balance, risk_per_trade))
+            for hold in trades
+        }
+        best = max(train, key=lambda hold: train[hold]["total_return"])
+        test = _stats(_segment(trades[best], split, end, initial_balance, risk_per_trade))
+
+        windows.append({
+            "window": len(windows),
+            "train_start": dates[start],
+            "train_end": dates[split - 1],
+            "test_start": dates[split],
+            "test_end": dates[end - 1],
+            "hold": best,
+            "train": train[best],
+            "test": test,
+        })
+    return windows, sorted(failed)
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from scanner import indicators, providers, technicals
+
+
+def _frame(bars=300, seed=0):
+    return providers.make_synthetic_frames(["T"], bars=bars, seed=seed)["T"]
+
+
+def _both(df):
+    return (
+        technicals.calculate_technicals(df, engine="numpy"),
+        technicals.calculate_technicals(df, engine="pandas"),
+    )
+
+
+def assert_engines_match(df):
+    fast, reference = _both(df)
+    # Same rows (dropna included), same columns in the same order
+    assert list(fast.columns) == list(reference.columns)
+    assert fast.index.equals(reference.index)
+    pd.testing.assert_frame_equal(fast, reference, check_exact=False, rtol=1e-9, atol=1e-9)
+    return fast
+
+
+def test_random_walk():
+    fast = assert_engines_match(_frame())
+    assert len(fast) > 0
+    for flag in ("Breakout", "Pullback_Bounce", "Volume_Spike", "Big_Green", "RSI_Strength",
+                 "Above_SMA20", "Bullish_Momentum"):
+        assert fast[flag].dtype == bool
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_flags_fire_identically(seed):
+    # Several seeds so each flag is both True and False somewhere
+    fast = assert_engines_match(_frame(bars=500, seed=seed))
+    assert fast["Breakout"].any() and not fast["Breakout"].all()
+
+
+def test_nan_gaps():
+    df = _frame()
+    df.iloc[80, df.columns.get_loc("Close")] = np.nan
+    df.iloc[120:123, df.columns.get_loc("Volume")] = np.nan
+    df.iloc[200, df.columns.get_loc("High")] = np.nan
+    fast = assert_engines_match(df)
+    # Rows with gaps in the inputs are dropped by both engines
+    for row in (80, 120, 121, 122, 200):
+        assert df.index[row] not in fast.index
+
+
+def test_integer_volume():
+    df = _frame()
+    df["Volume"] = df["Volume"].astype(np.int64)
+    fast = assert_engines_match(df)
+    assert fast["Volume"].dtype == np.int64
+
+
+@pytest.mark.parametrize("bars", [25, 30, 49, 50, 51, 55])
+def test_short_history(bars):
+    fast, reference = _both(_frame(bars=bars))
+    if reference.empty:
+        assert fast.empty
+        if len(reference.columns):
+            assert list(fast.columns) == list(reference.columns)
+    else:
+        assert_engines_match(_frame(bars=bars))
+
+
+def test_tz_aware_index():
+    df = _frame()
+    df.index = df.index.tz_localize("America/New_York")
+    fast = assert_engines_match(df)
+    assert fast.index.tz is not None
+
+
+def test_ewm_matches_pandas_default_adjust():
+    rng = np.random.default_rng(7)
+    panel = rng.normal(size=(400, 5))
+    panel[:30, 1] = np.nan  # late start
+    panel[[50, 51, 200], 2] = np.nan  # gaps
+    panel[350:, 3] = np.nan  # stops early
+    panel[:, 4] = np.nan  # never starts
+    expected = pd.DataFrame(panel).ewm(alpha=1 / 14, min_periods=14).mean().to_numpy()
+    np.testing.assert_allclose(indicators.ewm_mean(panel, 1 / 14, min_periods=14), expected, rtol=1e-12, atol=1e-12)
+    for column in range(panel.shape[1]):
+        np.testing.assert_allclose(
+            indicators.ewm_mean(panel[:, column], 1 / 14, min_periods=14), expected[:, column], rtol=1e-12, atol=1e-12
+        )
+
+
+def test_latest_signals_match_full_frame():
+    df = _frame(bars=400, seed=3)
+    full = technicals.calculate_technicals(df, engine="pandas")
+    signals = technicals.latest_signals(df)
+    assert signals[-1]["valid"] == technicals.is_valid_setup(full)
+    if signals[-1]["valid"]:
+        assert signals[-1]["setup"] == technicals.describe_setup(full)
+
+
+def test_mixed_calendars_match_per_ticker():
+    frames = providers.make_synthetic_frames([f"T{i}" for i in range(6)], bars=300, seed=4)
+    # Half the tickers miss some sessions, one has a duplicated bar
+    for ticker in ("T0", "T2", "T4"):
+        df = frames[ticker]
+        frames[ticker] = df.drop(df.index[[40, 90, 150, 260]])
+    frames["T5"] = pd.concat([frames["T5"], frames["T5"].iloc[-1:]])
+
+    results, failed = technicals.calculate_technicals_many(frames)
+    assert not failed
+    for ticker in ("T0", "T1", "T2", "T3", "T4"):
+        pd.testing.assert_frame_equal(results[ticker], technicals.calculate_technicals(frames[ticker]))
+
+    groups = technicals.group_frames(frames)
+    assert sorted(len(group) for group in groups) == [2, 3]
+    panel = technicals.build_panel(frames)
+    assert panel["tickers"] == ["T0", "T1", "T2", "T3", "T4"]
+
+
+def test_streaming_state_skips_nan_bars():
+    import json
+    from scanner.indicator_state import IndicatorState
+
+    df = _frame(bars=400, seed=6)
+    for column, row in (("Close", 120), ("Volume", 200), ("High", 310), ("Close", 330)):
+        df.iloc[row, df.columns.get_loc(column)] = np.nan
+    batch = technicals.calculate_technicals(df, engine="pandas")
+
+    state = IndicatorState.from_history(df.iloc[:320])
+    state = IndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+    rows = {ts: state.update(bar._asdict(), timestamp=ts)
+            for ts, bar in zip(df.index[320:], df.iloc[320:].itertuples(index=False))}
+
+    valid = [ts for ts, row in rows.items() if row["valid"]]
+    assert valid == [ts for ts in batch.index if ts > df.index[319]]
+    for ts in valid:
+        for column in batch.columns:
+            assert rows[ts][column] == pytest.approx(batch.at[ts, column], rel=1e-9)
+
+
+def test_streaming_state_matches_pandas_engine_from_first_bars():
+    # The early rows are where RSI's ewm weighting shows, so stream from bar 0
+    from scanner.indicator_state import IndicatorState
+
+    df = _frame(bars=300, seed=8)
+    batch = technicals.calculate_technicals(df, engine="pandas")
+    state = IndicatorState()
+    rows = {ts: state.update(bar._asdict(), timestamp=ts)
+            for ts, bar in zip(df.index, df.itertuples(index=False))}
+
+    assert [ts for ts, row in rows.items() if row["valid"]] == list(batch.index)
+    for ts in batch.index:
+        for column in batch.columns:
+            assert rows[ts][column] == pytest.approx(batch.at[ts, column], rel=1e-9)
+
+
+def test_streaming_state_follows_custom_rules():
+    from scanner import rules
+    from scanner.indicator_state import IndicatorState
+
+    df = _frame(bars=300, seed=9)
+    state = IndicatorState.from_history(df)
+    rules.add_rule("Any_Bar", "Any bar setup", "Close > 0", score=1, priority=0)
+    try:
+        full = technicals.calculate_technicals(df)
+        assert state.is_valid_setup() and technicals.is_valid_setup(full)
+        assert state.describe_setup() == technicals.describe_setup(full) == "Any bar setup"
+    finally:
+        rules.remove_rule("Any_Bar")
+    assert state.describe_setup() == technicals.describe_setup(technicals.calculate_technicals(df))
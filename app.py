@@ -84,27 +84,43 @@ tickers = load_tickers(price_filter)
 @st.cache_data(show_spinner=False)
 def run_scanner(tickers):
     results = []
-    for ticker in tickers:
-        try:
-            df = data_loader.get_data(ticker)
-            if df.empty:
+    errors = {}
+    # One bulk request per chunk, stopping at the first chunk that completes
+    # the results instead of downloading the whole universe
+    for start in range(0, len(tickers), data_loader.BULK_CHUNK_SIZE):
+        chunk = tickers[start:start + data_loader.BULK_CHUNK_SIZE]
+        frames, failed = data_loader.get_data_many(chunk)
+        errors.update(failed)
+
+        for ticker in chunk:
+            if ticker not in frames:
                 continue
+            try:
+                df = frames[ticker]
+                if df.empty:
+                    continue
 
-            latest_price = df["Close"].iloc[-1]
-            if price_filter == "Under $50" and latest_price > 50:
-                continue
-            elif price_filter == "Over $50" and latest_price <= 50:
-                continue
+                latest_price = df["Close"].iloc[-1]
+                if price_filter == "Under $50" and latest_price > 50:
+                    continue
+                elif price_filter == "Over $50" and latest_price <= 50:
+                    continue
 
-            df = technicals.calculate_technicals(df)
-            if not technicals.is_valid_setup(df):
-                continue
-            setup = technicals.describe_setup(df)
-            results.append((ticker, df, setup))
-        except Exception as e:
-            st.write(f"⚠️ Error with {ticker}: {e}")
+                signals = technicals.latest_signals(df)
+                if not signals or not signals[-1]["valid"]:
+                    continue
+                setup = signals[-1]["setup"]
+                results.append((ticker, technicals.calculate_technicals(df), setup))
+            except Exception as e:
+                errors[ticker] = str(e)
+            if len(results) >= 3:
+                break
         if len(results) >= 3:
             break
+
+    if errors:
+        ticker, reason = next(iter(errors.items()))
+        st.write(f"⚠️ Skipped {len(errors)} tickers with errors (e.g. {ticker}: {reason})")
     return results
 
 if st.session_state.first_load: